@@ -0,0 +1,175 @@
+import random
+import socket
+from time import perf_counter, sleep
+
+import httplib2
+import requests
+import urllib3
+
+from scheduler import TokenBucket
+
+# Per-user quotas of the Google APIs, as (tokens per second, bucket capacity)
+API_QUOTAS = {
+    # 250 quota units per second; send costs 100 units, drafts.create 10
+    'gmail': (250, 250),
+    # 60 read and 60 write requests per minute
+    'sheets_read': (1, 60),
+    'sheets_write': (1, 60),
+    # 12,000 queries per minute
+    'drive': (200, 200),
+}
+GMAIL_COSTS = {
+    'send': 100,
+    'drafts.create': 10,
+    'getProfile': 1,
+}
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError'}
+NETWORK_ERRORS = (
+    ConnectionError, TimeoutError, socket.timeout, socket.gaierror, httplib2.HttpLib2Error,
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+)
+
+
+def error_status(error):
+    """HTTP status and headers of a googleapiclient, gspread or requests error, if any."""
+    resp = getattr(error, 'resp', None)
+    if resp is not None and hasattr(resp, 'status'):
+        return int(resp.status), resp
+    response = getattr(error, 'response', None)
+    if response is not None and hasattr(response, 'status_code'):
+        return int(response.status_code), response.headers
+    return None, {}
+
+
+def never_sent(error):
+    """True when a network error happened before the request reached the server: DNS failure, connection refused."""
+    if isinstance(error, (ConnectionRefusedError, socket.gaierror, httplib2.ServerNotFoundError,
+                          requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        reason = getattr(error.args[0], 'reason', error.args[0])
+        return isinstance(reason, (urllib3.exceptions.NewConnectionError, ConnectionRefusedError))
+    return False
+
+
+def classify_error(error, idempotent=True):
+    """
+    Return (retryable, retry_after) for an exception raised by a Google API call.
+
+    429s, 5xxs, 403 rate limit errors and network failures are retryable; everything
+    else (bad request, auth, not found...) is fatal. `retry_after` is the delay asked
+    by the server in its Retry-After header, in seconds, or None.
+
+    A call that isn't `idempotent`, such as sending an email or inserting a row, may have
+    been applied by the server before a 5xx or a dropped connection: it is only retryable
+    when the server turned it down (429, 403 rate limit) or was never reached.
+    """
+    status, headers = error_status(error)
+    if status is None:
+        if not idempotent:
+            return never_sent(error), None
+        return isinstance(error, NETWORK_ERRORS), None
+    retry_after = None
+    try:
+        retry_after = float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError, AttributeError):
+        pass
+    if status in RETRYABLE_STATUS and (idempotent or status == 429):
+        return True, retry_after
+    if status == 403 and any(reason in str(error) for reason in RETRYABLE_REASONS):
+        return True, retry_after
+    return False, None
+
+
+def maybe_applied(error):
+    """True when a call that isn't idempotent failed in a way that doesn't tell whether the server applied it."""
+    return classify_error(error)[0] and not classify_error(error, idempotent=False)[0]
+
+
+def endpoint_name(api, call):
+    """Name of the endpoint `call` requests, e.g. "gmail.users.messages.send"; just `api` for a lambda."""
+    target = getattr(call, '__self__', None)
+    method_id = getattr(target, 'methodId', None)
+    if method_id:
+        return method_id
+    name = getattr(call, '__name__', '<lambda>')
+    if target is not None and type(target).__name__ == 'BatchHttpRequest':
+        return f"{api}.batch"
+    return api if name == '<lambda>' else f"{api}.{name}"
+
+
+def request_size(call):
+    """Size of the body of a googleapiclient request, 0 when unknown."""
+    body = getattr(getattr(call, '__self__', None), 'body', None)
+    return len(body) if isinstance(body, (str, bytes)) else 0
+
+
+class ApiExecutor:
+    """
+    Shared execution wrapper for Gmail, Sheets and Drive calls.
+
+    Every call first takes its cost from the budget of its API, a `TokenBucket` sized
+    from `API_QUOTAS`, so a long run stays under the per-user quotas instead of running
+    into them. Retryable errors are retried with exponential backoff and full jitter, or
+    after the Retry-After delay when the server gives one; fatal errors are raised
+    straight away, and so are the errors of a call that isn't idempotent when it may
+    have been applied. With `metrics` set, the latency, errors and retries of every call and
+    the time spent waiting for the budget are recorded there.
+
+    Attributes:
+        budgets (dict): API name -> TokenBucket.
+        max_retries (int): Number of retries before the last error is raised.
+        base_delay (float): Backoff of the first retry, in seconds.
+        max_delay (float): Upper bound of the backoff, in seconds.
+        sleep (callable): Function used to wait between retries.
+        metrics (Metrics): Where calls are recorded, or None.
+    """
+
+    def __init__(self, quotas=None, max_retries=5, base_delay=1.0, max_delay=64.0, sleep=sleep, metrics=None):
+        quotas = API_QUOTAS if quotas is None else quotas
+        self.budgets = {api: TokenBucket(rate, capacity) for api, (rate, capacity) in quotas.items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.metrics = metrics
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def execute(self, api: str, call, cost=1, endpoint=None, idempotent=True):
+        """
+        Run `call()` against the budget of `api` and return its result.
+
+        `call` must make the request itself, e.g. `request.execute` or
+        `lambda: worksheet.update_cell(1, 1, "x")`, so a retry sends it again.
+        `endpoint` names the call in the metrics, guessed from `call` when not given.
+        Set `idempotent` off for a call that must not be made twice, like messages.send.
+        """
+        metrics = self.metrics
+        if metrics is not None and endpoint is None:
+            endpoint = endpoint_name(api, call)
+        for attempt in range(self.max_retries + 1):
+            if api in self.budgets:
+                started = perf_counter()
+                self.budgets[api].acquire(cost)
+                if metrics is not None:
+                    metrics.record_quota_wait(api, perf_counter() - started)
+            started = perf_counter()
+            try:
+                if metrics is None:
+                    return call()
+                with metrics.call(endpoint):
+                    result = call()
+                metrics.record(endpoint, perf_counter() - started, request_bytes=request_size(call))
+                return result
+            except Exception as e:
+                if metrics is not None:
+                    metrics.record(endpoint, perf_counter() - started, e)
+                retryable, retry_after = classify_error(e, idempotent)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                if metrics is not None:
+                    metrics.record_retry(endpoint)
+                self.sleep(retry_after if retry_after is not None else self.backoff(attempt))
@@ -1,31 +1,49 @@
-import base64
+import argparse
 import json
 import locale
-import msvcrt
+import multiprocessing
 import os
 import pickle
-import random
-import re
 import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from time import sleep
-from version import check_for_updates
+from time import perf_counter, sleep
+from version import is_update_available, start_update
+from sheet_buffer import PendingWrites, SheetWriteBuffer
+from notary_index import AmbiguousNotary, NotaryIndex
+from column_schema import ColumnSchema, SchemaError
+from email_templates import MessageFactory
+from gmail_batch import DraftBatch
+from google_transport import GoogleTransport
+from scheduler import TokenBucket
+from sender_pool import Sender, SenderPool
+from api_retry import GMAIL_COSTS, ApiExecutor, maybe_applied
+from journal import JobJournal
+from local_cache import DiskCache
+from sheet_snapshot import SheetSnapshotStore
+from sheet_stream import iter_rows
+from invoices import TemplateError, generate_invoices, generate_pdf_invoices, load_template
+from console import read_choice
+from metrics import Metrics
+from outbox import Outbox
+from run_summary import RunSummary
 
 import gspread
-from docx import Document
-from docx2pdf import convert
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 from gspread.exceptions import SpreadsheetNotFound
-from unidecode import unidecode
 from dotenv import load_dotenv
 
+try:
+    from docx2pdf import convert
+except ImportError:
+    # docx2pdf drives Word, so it is only installed on Windows and macOS
+    convert = None
+
 
 class GoogleServices:
     """
@@ -35,11 +53,17 @@ class GoogleServices:
     authenticated services for Google Drive and Gmail. It simplifies the process of
     setting up authentication and obtaining user-specific credentials.
 
+    The API clients are built from the discovery documents bundled with
+    googleapiclient, and only when they are first used.
+
     Attributes:
         creds (Credentials): The user's OAuth2 credentials.
         gmail_service (Resource): Authenticated service for Gmail API.
         drive_service (Resource): Authenticated service for Google Drive API.
+        sheet_service (Resource): Authenticated service for Google Sheets API.
+        gc (gspread.Client): gspread client authorized with the same credentials.
         email (str): The user's email address associated with the authenticated account.
+        interns (dict): Authorized sender emails -> {'Name', 'Phone'}.
     """
     SCOPES = [
         "https://www.googleapis.com/auth/gmail.compose",
@@ -47,42 +71,81 @@ class GoogleServices:
         "https://www.googleapis.com/auth/drive"
     ]
     INTERN_SHEET_KEY = "1cveFT3BvSJ9d-PvBdyGvZ7Fd_0XYDlNafOpTXUiz_eI"
+    # The intern directory is reused for INTERN_CACHE_TTL seconds, then revalidated
+    INTERN_CACHE_PATH = "intern_cache.json"
+    INTERN_CACHE_TTL = 6 * 60 * 60
+    # Credentials of the other intern accounts of the sender pool, one file per account
+    SENDER_TOKENS_DIR = "sender_tokens"
     creds = None
-    gmail_service = None
-    drive_service = None
-    sheet_service = None
     email = None
+    interns = None
     sender_name = None
     phone = None
     signature = None
 
-    def __init__(self):
-        self.login()
-        self.set_signature()
-        
+    def __init__(self, interactive=True):
+        self.interactive = interactive
+        self._session = None
+        self._services = {}
+        self._gc = None
+        self._lock = threading.Lock()
+        self.cache = DiskCache(self.INTERN_CACHE_PATH, self.INTERN_CACHE_TTL)
+        self.load_credentials()
+        # The profile and the intern directory only need the credentials
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            email = pool.submit(self.get_email)
+            interns = pool.submit(self.get_interns)
+            self.email = email.result()
+            self.interns = interns.result()
+
+    @property
+    def session(self):
+        """HTTP session of the account, shared by its clients and threads."""
+        with self._lock:
+            if self._session is None:
+                self._session = transport.session(self.creds)
+            return self._session
+
+    def _service(self, name, version):
+        session = self.session
+        with self._lock:
+            if name not in self._services:
+                self._services[name] = transport.build(session, name, version)
+            return self._services[name]
+
+    @property
+    def gmail_service(self):
+        return self._service('gmail', 'v1')
+
+    @property
+    def drive_service(self):
+        return self._service('drive', 'v3')
+
+    @property
+    def sheet_service(self):
+        return self._service('sheets', 'v4')
+
+    @property
+    def gc(self):
+        session = self.session
+        with self._lock:
+            if self._gc is None:
+                self._gc = transport.gspread_client(session)
+            return self._gc
+
     def login(self):
-        self.authenticate()
-        INTERNS = self.get_interns()
+        INTERNS = self.interns
         clear_display()
         while True:
             print("\n")
             print_center(f"Last Logged-in Account : {self.email}")
             print("\n")
             print_center("Do you want to use it (y/n) : ")
-            while True:
-                if msvcrt.kbhit():
-                    choice = msvcrt.getch().decode('utf-8').lower()
-                    if choice == "y" or choice == "n":
-                        print("\nLoading...")
-                        break
-                sleep(0.1)
-            while msvcrt.kbhit():
-                msvcrt.getch()
+            choice = read_choice("yn")
+            print("\nLoading...")
             if choice == "n":
                 self.authenticate(True)
-            if self.email in INTERNS.keys():
-                self.sender_name = INTERNS[self.email]["Name"]
-                self.phone = INTERNS[self.email]["Phone"]
+            if self.use_account():
                 break
             else:
                 clear_display()
@@ -92,9 +155,22 @@ class GoogleServices:
                     print("  ", i)
                 print()
 
+    def use_account(self):
+        """Take the sender name and phone of the logged-in account from the intern directory; False if it's not there."""
+        if not self.is_intern(self.email):
+            return False
+        self.sender_name = self.interns[self.email]["Name"]
+        self.phone = self.interns[self.email]["Phone"]
+        self.set_signature()
+        return True
+
     def authenticate(self, new=False):
         """This will help to create service for the object"""
+        self.load_credentials(new)
+        self.email = self.get_email()
 
+    def load_credentials(self, new=False):
+        """Load the saved OAuth2 credentials, refreshing them or logging in again when needed."""
         if new:
             self.creds = None
         else:
@@ -108,6 +184,8 @@ class GoogleServices:
             try:
                 self.creds.refresh(Request())
             except:
+                if not self.interactive:
+                    raise RuntimeError("No valid saved credentials, log in once from the menu first")
                 # Use the JSON file containing your OAuth2 credentials
                 flow = InstalledAppFlow.from_client_config(client_secret_info, self.SCOPES)
                 self.creds = flow.run_local_server(port=0)
@@ -116,18 +194,41 @@ class GoogleServices:
             with open('secret_token.pickle', 'wb') as token:
                 pickle.dump(self.creds, token)
 
-        self.gmail_service = build('gmail', 'v1', credentials=self.creds)
-        self.drive_service = build('drive', 'v3', credentials=self.creds)
-        self.sheet_service = build('sheets', 'v4', credentials=self.creds)
-        profile = self.gmail_service.users().getProfile(userId='me').execute()
-        self.email = profile['emailAddress']
-
-    def get_interns(self):
-        gc = gspread.authorize(self.creds)
-        spreadsheet = gc.open_by_key(self.INTERN_SHEET_KEY) 
-        worksheet = spreadsheet.get_worksheet(0)
-
-        interns_data = worksheet.get_all_records()
+        # Clients of the previous account are rebuilt on first use
+        with self._lock:
+            self._session = None
+            self._services = {}
+            self._gc = None
+
+    def get_email(self):
+        profile = api.execute('gmail', self.gmail_service.users().getProfile(userId='me').execute,
+                              cost=GMAIL_COSTS['getProfile'])
+        return profile['emailAddress']
+
+    def get_interns(self, revalidate=False):
+        """
+        Intern directory from the local cache, fetched again only when the sheet changed.
+
+        The cache is trusted for a while without asking; with `revalidate`, the version of
+        the sheet is checked right away.
+        """
+        version = lambda: get_file_version(self.drive_service, self.INTERN_SHEET_KEY)
+        return self.cache.get('interns', self.fetch_interns, version() if revalidate else version)
+
+    def is_intern(self, email):
+        """True when `email` is in the intern directory, checking the sheet itself before saying no."""
+        if email not in self.interns:
+            # It may have been added since the directory was cached
+            self.interns = self.get_interns(revalidate=True)
+        return email in self.interns
+
+    def fetch_interns(self):
+        spreadsheet = api.execute('sheets_read', lambda: self.gc.open_by_key(self.INTERN_SHEET_KEY),
+                                  endpoint='sheets_read.open_by_key')
+        worksheet = api.execute('sheets_read', lambda: spreadsheet.get_worksheet(0),
+                                endpoint='sheets_read.get_worksheet')
+
+        interns_data = api.execute('sheets_read', worksheet.get_all_records)
 
         interns_dict = {}
         for intern in interns_data:
@@ -138,65 +239,241 @@ class GoogleServices:
         return interns_dict
     
     def set_signature(self):
-        self.signature = f'''
+        self.signature = self.cache.get(f'signature {self.email}', self.render_signature,
+                                        [self.sender_name, self.phone])
+
+    def render_signature(self):
+        return render_signature(self.sender_name, self.phone)
+
+    def sender_token_path(self, email):
+        return os.path.join(self.SENDER_TOKENS_DIR, f"{email}.pickle")
+
+    def load_sender_credentials(self, email):
+        """Stored credentials of another intern account, refreshed when needed, or None."""
+        path = self.sender_token_path(email)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as token:
+            creds = pickle.load(token)
+        if not creds.valid:
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                print(f"Credentials of {email} could not be refreshed: {e}")
+                return None
+            with open(path, 'wb') as token:
+                pickle.dump(creds, token)
+        return creds
+
+    def add_sender(self):
+        """Log in another intern account and store its credentials for the sender pool."""
+        flow = InstalledAppFlow.from_client_config(client_secret_info, self.SCOPES)
+        creds = flow.run_local_server(port=0)
+        service = transport.build(transport.session(creds), 'gmail', 'v1')
+        profile = api.execute('gmail', service.users().getProfile(userId='me').execute,
+                              cost=GMAIL_COSTS['getProfile'])
+        email = profile['emailAddress']
+        if not self.is_intern(email):
+            print(f"\n{email} is not an intern account")
+            return None
+        os.makedirs(self.SENDER_TOKENS_DIR, exist_ok=True)
+        with open(self.sender_token_path(email), 'wb') as token:
+            pickle.dump(creds, token)
+        return email
+
+
+def render_signature(sender_name, phone):
+    return f'''
             <div style="color: rgb(118, 165, 175); font-family: comic sans ms, sans-serif;">
-            <b><p>{self.sender_name}</p>
+            <b><p>{sender_name}</p>
             <p>p/o Laura LASSERRE</p>
             <p>LD Généalogie</p>
             <p>Adresses : </p>
             <p>23 rue Fernand Rabier, 45000 ORLÉANS (Siège social)</p>
             <p>14 avenue de l'Opéra, 75001 PARIS</p>
-            <p>+33 {self.phone}</p></b>
+            <p>+33 {phone}</p></b>
             <img src="https://drive.google.com/uc?id=1rIM5ATxjtV1qQh_etMKFzEvzn3USqCt5">
             </div>'''
 
 
-def get_filled_row_values(worksheet , row_number):
-    merged_ranges = worksheet.spreadsheet.fetch_sheet_metadata()['sheets'][0]['merges']
-    row_values = worksheet.row_values(row_number)
-    
+def get_file_version(drive_service, file_id):
+    """Drive revision number of a file, bumped on every edit."""
+    file = api.execute('drive', drive_service.files().get(fileId=file_id, fields='version').execute)
+    return file['version']
+
+
+def get_spreadsheet_version(spreadsheet_id):
+    return get_file_version(user.drive_service, spreadsheet_id)
+
+
+def count_response_bytes(response, *args, **kwargs):
+    """Response hook of the Google sessions, counting the bytes of each response."""
+    metrics.add_bytes(len(response.content))
+
+
+def write_run_report(task):
+    """Write the metrics of the task that just ended to RUN_REPORT_PATH, and its CSV next to it."""
+    try:
+        report = metrics.write(RUN_REPORT_PATH, task)
+        print(f"\nRun report : {report['rows_per_hour']} rows/hour, "
+              f"{report['api_calls_per_row']} API calls per row, slowest stage : {report['slowest_stage']}")
+    except OSError as e:
+        print(f"Error writing the run report: {e}")
+
+
+def get_all_values(worksheet):
+    """`worksheet.get_all_values()`, served from the local snapshot while the spreadsheet is unchanged."""
+    with metrics.stage("get_all_values"):
+        return snapshots.get_all_values(
+            worksheet, get_spreadsheet_version(worksheet.spreadsheet.id),
+            lambda: api.execute('sheets_read', worksheet.get_all_values))
+
+
+def iter_target_rows(worksheet):
+    """
+    (row number, row) of a target sheet, with only the columns the notary flow reads.
+
+    Served from the local snapshot while the spreadsheet is unchanged, streamed block
+    by block otherwise so a large sheet is processed while it is still downloading.
+    """
+    return snapshots.iter_values(
+        worksheet, get_spreadsheet_version(worksheet.spreadsheet.id), NOTARY_FLOW_COLUMNS,
+        lambda: iter_rows(worksheet, NOTARY_FLOW_COLUMNS, STREAM_BLOCK_ROWS, executor=api))
+
+
+def get_filled_rows(worksheet, first_row, last_row):
+    """
+    Values of rows `first_row` to `last_row`, with merged cells filled across their columns.
+
+    The values and the merge ranges are read with a single spreadsheets.get call and the
+    result is kept for as long as the spreadsheet revision doesn't change.
+    """
+    key = (worksheet.spreadsheet.id, worksheet.id, first_row, last_row)
+    version = get_spreadsheet_version(worksheet.spreadsheet.id)
+    if key in filled_rows_cache and filled_rows_cache[key][0] == version:
+        return [list(row) for row in filled_rows_cache[key][1]]
+
+    metadata = api.execute('sheets_read', lambda: worksheet.spreadsheet.fetch_sheet_metadata(params={
+        'ranges': f"'{worksheet.title}'!{first_row}:{last_row}",
+        'includeGridData': 'true',
+        'fields': 'sheets(merges,data(startRow,rowData(values(formattedValue))))',
+    }), endpoint='sheets_read.fetch_sheet_metadata')
+    sheet = metadata['sheets'][0]
+    merged_ranges = sheet.get('merges', [])
+    grid = sheet['data'][0]
+    row_data = grid.get('rowData', [])
+    start_row = grid.get('startRow', first_row - 1)
+
     # Determine the maximum column index in merged_ranges
-    max_col_index = max(merge['endColumnIndex'] for merge in merged_ranges)
-    # Extend row_values to cover the entire range of columns
-    row_values.extend([''] * (max_col_index - len(row_values)))
-    
-    # Process each merged range
-    for merge in merged_ranges:
-        # If the merge affects the row in question
-        if merge['startRowIndex'] < row_number <= merge['endRowIndex']:
-            # Get the value from the first cell of the merged range
-            start_col_index = merge['startColumnIndex']
-            end_col_index = merge['endColumnIndex']
-            merged_value = worksheet.cell(row_number, start_col_index + 1).value
-
-            # Apply this value to all cells in the merged range within the row
-            for col_index in range(start_col_index, end_col_index):
-                row_values[col_index] = merged_value
+    max_col_index = max((merge['endColumnIndex'] for merge in merged_ranges), default=0)
+    rows = []
+    for row_number in range(first_row, last_row + 1):
+        offset = row_number - 1 - start_row
+        cells = row_data[offset].get('values', []) if 0 <= offset < len(row_data) else []
+        row_values = [cell.get('formattedValue', '') for cell in cells]
+        # Extend row_values to cover the entire range of columns
+        row_values.extend([''] * (max_col_index - len(row_values)))
+
+        # Process each merged range
+        for merge in merged_ranges:
+            # If the merge affects the row in question
+            if merge['startRowIndex'] < row_number <= merge['endRowIndex']:
+                # Get the value from the first cell of the merged range
+                start_col_index = merge['startColumnIndex']
+                end_col_index = merge['endColumnIndex']
+                merged_value = row_values[start_col_index]
+
+                # Apply this value to all cells in the merged range within the row
+                for col_index in range(start_col_index, end_col_index):
+                    row_values[col_index] = merged_value
+        rows.append(row_values)
+
+    filled_rows_cache[key] = (version, rows)
+    return [list(row) for row in rows]
+
+
+def parse_row_list(user_input: str):
+    """Row numbers from operator input such as "120,121,130-180"."""
+    rows = []
+    for item in user_input.split(","):
+        item = item.strip()
+        try:
+            if "-" in item:
+                first_row, last_row = (int(value) for value in item.split("-", 1))
+                rows.extend(range(first_row, last_row + 1))
+            else:
+                rows.append(int(item))
+        except ValueError:
+            print(f"Invalid input '{item}'. Please enter only integers or ranges (120-180) separated by commas.")
+    return rows
 
-    return row_values
 
-def find_column_index(primary_header_row, secondary_header_row, target_secondary_heading, target_primary_heading=None):
-    # Iterate over both header rows simultaneously
-    for index, (primary, secondary) in enumerate(zip(primary_header_row, secondary_header_row)):
-        # Check if the current column's secondary header matches the target
-        if secondary == target_secondary_heading:
-            # If a primary header is specified, check for a match; otherwise, return the current index
-            if target_primary_heading is None or primary == target_primary_heading:
-                return index
+def get_rows(worksheet, rows):
+    """
+    Fetch the values of `rows` with one batch_get call.
+
+    Contiguous row numbers are requested as a single range. Returns a dict
+    row number -> row values (an empty list for an empty row).
+    """
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row - 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    if not ranges:
+        return {}
+    with metrics.stage("get_rows"):
+        value_ranges = api.execute('sheets_read', lambda: worksheet.batch_get(
+            [f"{first_row}:{last_row}" for first_row, last_row in ranges]), endpoint='sheets_read.batch_get')
+    row_values = {}
+    for (first_row, last_row), values in zip(ranges, value_ranges):
+        for row in range(first_row, last_row + 1):
+            offset = row - first_row
+            row_values[row] = list(values[offset]) if offset < len(values) else []
+    return row_values
 
-    # Return None if no matching column is found
-    return None
 
-    
 def get_row_by_name(first_name : str ,last_name : str):
-    pattern = r'[ ,\-\n]'
-    first_name = unidecode(re.sub(pattern, '', first_name)).lower()
-    last_name = unidecode(re.sub(pattern, '', last_name)).lower()
-    all_rows = notary_worksheet.get_all_values()
-    for index, row in enumerate(all_rows, start=1):
-        if first_name == unidecode(re.sub(pattern, '', row[1])).lower() and last_name == unidecode(re.sub(pattern, '', row[2])).lower():
-            return index, row
-    return None, None
+    return notary_index.find(first_name, last_name)
+
+
+def load_notary_index():
+    """Fetch the notary sheet once so the lookups of a run don't hit the network."""
+    global notary_index, notary_worksheet
+    if notary_worksheet is None:
+        notary_sheet = api.execute('sheets_read', lambda: gc.open_by_key(NOTARY_SHEET_KEY),
+                                   endpoint='sheets_read.open_by_key')
+        notary_worksheet = api.execute('sheets_read', lambda: notary_sheet.get_worksheet(0),
+                                       endpoint='sheets_read.get_worksheet')
+    notary_index = NotaryIndex(get_all_values(notary_worksheet))
+
+
+def update_notary_cell(row_index, col, value):
+    sheet_buffer.update_cell(notary_worksheet, row_index, col, value)
+    notary_index.update_cell(row_index, col, value)
+
+
+def insert_notary_row(notary_sheet_row):
+    with notary_index.lock:
+        notary_sheet_index = notary_index.next_row()
+        # Pending notary updates must land before the rows below shift, their row
+        # numbers would point at the row above theirs otherwise
+        sheet_buffer.flush(notary_worksheet)
+        if sheet_buffer.has_pending(notary_worksheet):
+            raise PendingWrites(f"Notary sheet updates could not be written, {notary_sheet_row[1]} "
+                                f"{notary_sheet_row[2]} is not added yet")
+        try:
+            api.execute('sheets_write', lambda: notary_worksheet.insert_row(
+                notary_sheet_row, index=notary_sheet_index, inherit_from_before=True),
+                endpoint='sheets_write.insert_row', idempotent=False)
+        except Exception as e:
+            if maybe_applied(e):
+                # The row may be in the sheet all the same: read the row numbers again from it
+                notary_index.reload(api.execute('sheets_read', notary_worksheet.get_all_values))
+            raise
+        notary_index.insert_row(notary_sheet_row, notary_sheet_index)
+    return notary_sheet_index
 
 
 def print_center(text):
@@ -205,146 +482,66 @@ def print_center(text):
     print(" " * padding + text)
 
 
-def send_email(message: MIMEMultipart):
+def send_email(message: MIMEMultipart, sender: Sender = None):
     try:
-        status = user.gmail_service.users().messages().send(
-            userId=user.email, body=message).execute()
+        if sender is not None:
+            request = sender.send_request(message)
+        else:
+            request = user.gmail_service.users().messages().send(userId=user.email, body=message)
+        with metrics.stage("send"):
+            status = api.execute('gmail', request.execute, cost=GMAIL_COSTS['send'], idempotent=False)
         if status:
             print("\nEmail sent successfully.")
-            sleep(2)
+            sleep(EMAIL_PAUSE)
             return status
     except Exception as e:
+        if maybe_applied(e):
+            raise
         print(f"Error sending email: {e}")
+        summary.error("send", e)
 
 
 def create_draft(message: MIMEMultipart):
     try:
-        status = user.gmail_service.users().drafts().create(
-            userId=user.email, body={'message': message}).execute()
+        with metrics.stage("draft"):
+            status = api.execute('gmail', user.gmail_service.users().drafts().create(
+                userId=user.email, body={'message': message}).execute, cost=GMAIL_COSTS['drafts.create'])
         if status:
             return status
     except Exception as e:
         print(f"Error creating draft: {e}")
+        summary.error("draft", e)
 
 
 def create_notary_message(sender: str, to: str, person_full_name: str, person_last_name: str, notary_last_name: str, person_don: str):
-    message = MIMEMultipart()
-    message['From'] = sender
-    message['To'] = to
-    message['Subject'] = f'Succession {person_last_name} - Demande de mise en relation'
-    message_html = f'''
-            <p>À l'attention de Maître {notary_last_name}</p>
-            <p>Maître, </p>
-            <p>Dans le cadre de notre activité, nous avons développé une nouvelle prestation dédiée à la recherche de bénéficiaires d'actifs non réclamés.</p>
-            <p>Votre étude s'est chargée de régler la succession de {person_full_name} dont l'acte de notoriété a été établi le {person_don}. Toutefois, il reste toujours des fonds au nom de cette personne. </p>
-            <p>Affirmatifs sur l'existence de fonds au nom de {person_full_name}, nous n'en connaissons, pour le moment, ni le support (compte bancaire, assurance vie, plan épargne retraite, épargne salariale, etc) ni le montant. </p>
-            <p>Ne pouvant nous mandater nous-mêmes, nous avons besoin de rentrer en contact avec les héritiers afin de proposer notre prestation pour obtenir les informations précitées et débloquer lesdits fonds. Ainsi, <b>pouvez-vous transmettre mes coordonnées à l'un des héritiers afin que ce dernier puisse revenir vers moi pour de plus amples renseignements ?</b></p>
-            <p>À titre informatif, sachez que :</p>
-            <ul>
-            <li>Si la succession est toujours ouverte, les fonds débloqués seront réintégrés déduits de nos honoraires</li>
-            <li>Si la succession est clôturée, les fonds seront directement reversés aux héritiers, et nous vous en aviserons si le montant de ces derniers pourrait avoir un impact sur les droits.</li>
-            </ul>
-            <p>Vous trouverez en pièce jointe une copie de la carte professionnelle de Madame Laura LASSERRE, gérante de l'étude.</p>
-            <p>Vous remerciant par avance de votre concours.</p>
-            <p>Bien cordialement,</p>
-        '''
-    message.attach(MIMEText(message_html + user.signature, 'html'))
-
-    with open(resource_path("attachment.pdf"), 'rb') as pdf_file:
-        pdf_attachment = MIMEApplication(pdf_file.read(), _subtype='pdf')
-        pdf_attachment.add_header(
-            'Content-Disposition', f'attachment; filename=Carte_pro_Laura_LASSERRE.pdf')
-        message.attach(pdf_attachment)
-
-    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
+    return message_factory.notary(sender, to, person_full_name, person_last_name, notary_last_name, person_don)
 
 
 def create_client_message(sender: str, to: str, person_full_name: str, amount_found_by_us: str, amount_with_tex: str, amount_after_fee: str):
-    message = MIMEMultipart()
-    message['From'] = sender
-    message['To'] = to
-    message['Subject'] = f'Retour sur actifs débloqués - {person_full_name}'
-    message_html = f'''
-            <p>Bonjour,</p>
-            <p>Je reviens vers vous concernant les actifs au nom de {person_full_name}.</p>
-            <p>Suite au retour du notaire, je vous informe que les fonds débloqués s'élèvent à {amount_found_by_us} (voir pièce jointe).</p>
-            <p>Conformément au contrat précédemment signé, nos honoraires sont de {amount_with_tex} TTC de sorte que la somme vous revenant est de {amount_after_fee}.</p>
-            <p>Au regard des articles 11 et 12 du contrat, deux options s'offrent à vous :</p>
-            <ul>
-                <li>Récupérer ces fonds auquel cas il convient de nous faire parvenir votre RIB par mail ou par courrier. Nous procéderons à une vérification avant tout envoi des fonds</li>
-                <li>Faire don de la somme à une association de notre choix. Dans cette hypothèse, il convient impérativement  de nous donner votre accord par écrit en réponse à ce mail</li>
-            </ul>
-            <p>Nous vous informons qu'en cas de non retour de votre part sur votre choix dans un délai de deux mois à compter de la réception de ce mail, nous verserons automatiquement les fonds à une association.</p>
-            <p>Conformément au RGPD, nous vous informons que nous supprimerons à la clôture du dossier de manière sécurisée la copie de votre RIB.</p>
-            <p>Je reste à votre disposition pour répondre à d'éventuelles questions par téléphone au 07.45.25.93.99.</p>
-            <p>Vous remerciant par avance pour votre retour,</p>
-            <p>Bien cordialement,</p>
-        '''
-    message.attach(MIMEText(message_html + user.signature, 'html'))
-
-    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
+    return message_factory.client(sender, to, person_full_name, amount_found_by_us, amount_with_tex, amount_after_fee)
 
 
 def create_facture_message(sender: str, to: str, person_full_name: str):
-    message = MIMEMultipart()
-    message['From'] = sender
-    message['To'] = to
-    message['Subject'] = f'Clôture dossier {person_full_name}'
-    message_html = f'''
-            <p>Bonjour,</p>
-            <p>Je reviens vers vous concernant les actifs au nom de {person_full_name}</p>
-            <p>Je vous informe que l'étude vous a transmis les fonds vous revenant déduit de nos honoraires. Pour rappel, en cas de pluralité d'héritiers, vous vous êtes engagés, en signant le contrat, à faire le partage desdits fonds entre les différents héritiers.</p>
-            <p>Notre mission étant désormais terminée, je vous remercie de votre confiance et vous invite à laisser un avis sur la page Google de LD Généalogie. En effet, comme vous l'étiez probablement lors de notre premier échange, les bénéficiaires sont souvent méfiants vis-à-vis de notre démarche. Ainsi, votre témoignage pourra les rassurer et nous permettre de débloquer et restituer d'avantage de fonds.</p>
-            <p>Vous souhaitant une bonne continuation,</p>
-            <p>Bien cordialement,</p>
-        '''
-    message.attach(MIMEText(message_html + user.signature, 'html'))
-
-    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
-
-
-def create_facture_files(name, facture_number, ht, tva, tcc, paid_date):
-    if not os.path.exists("Invoice"):
-        os.makedirs("Invoice")
-    doc = Document(resource_path("template.docx"))
-    date = datetime.now().date().strftime('%d %B %Y')
-    text_replacements = {
-        "(DATE)": date,
-        "(B)": name,
-        "(Q)": facture_number,
-        "(R)": ht,
-        "(S)": tva,
-        "(T)": tcc,
-        "(W)": paid_date,
-    }
-
-    def modify_run(run):
-        for find_text, replace_text in text_replacements.items():
-            if find_text in run.text:
-                run.text = run.text.replace(find_text, replace_text)
+    return message_factory.facture(sender, to, person_full_name)
 
-    # Replace text in Header
-    header = doc.sections[0].header
-    for paragraph in header.paragraphs:
-        for run in paragraph.runs:
-            modify_run(run)
 
-    # Replace text in Body
-    for paragraph in doc.paragraphs:
-        for run in paragraph.runs:
-            modify_run(run)
+def new_sender(email, build_service, signature):
+    return Sender(email, build_service, MessageFactory(signature, resource_path("attachment.pdf")),
+                  TokenBucket(1 / SEND_INTERVAL, capacity=1, jitter=SEND_JITTER))
 
-    # Replace text in Table
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for run in paragraph.runs:
-                        modify_run(run)
 
-    # Save the modified document
-    doc.save(f"Invoice/{facture_number} {name}.docx")
-    convert(f"Invoice/{facture_number} {name}.docx")
+def load_sender_pool():
+    """Sender pool of the logged-in account and of every intern account with stored credentials."""
+    senders = [new_sender(user.email, lambda: user.gmail_service, user.signature)]
+    for email, intern in user.interns.items():
+        if email == user.email:
+            continue
+        creds = user.load_sender_credentials(email)
+        if creds is None:
+            continue
+        senders.append(new_sender(email, lambda creds=creds: transport.build(transport.session(creds), 'gmail', 'v1'),
+                                  render_signature(intern['Name'], intern['Phone'])))
+    return SenderPool(senders, SENDER_DAILY_LIMIT, SENDER_QUOTA_PATH)
 
 
 def update_date(row_index, all_date):
@@ -352,92 +549,411 @@ def update_date(row_index, all_date):
         if all_date[i] == "-":
             break
     date = datetime.now().date().strftime("%d/%m/%Y")
-    notary_worksheet.update_cell(row_index, 12+i, date)
+    update_notary_cell(row_index, 12+i, date)
+    return 12+i, date
 
 
-def send_notary_emails(spreadsheet: gspread.Spreadsheet):
-    worksheet = spreadsheet.get_worksheet(0)
-    all_values = worksheet.get_all_values()
-    for index, row in enumerate(all_values, start=1):
-        if row[10] == "à envoyer":
-            notary_email = str(row[8]).split("\n")[0]
-            person_full_name = str(row[0]).strip()
-            words = person_full_name.split()
-            person_last_name = " ".join(
-                [word for word in words if word.isupper()])
-            if not person_last_name.strip():
-                continue
-            notary_full_name = str(row[5]).strip()
-            words = notary_full_name.split()
-            notary_last_name = " ".join(
-                [word for word in words if word.isupper()])
-            notary_first_name = notary_full_name.replace(
-                notary_last_name, "").strip()
-            if not notary_last_name.strip():
-                continue
-            person_don = row[4]
+def write_back(worksheet, index, stage, status, updates):
+    """
+    Journal a row Gmail has handled, then queue its sheet updates.
+
+    `updates` are (worksheet, row, col, value) tuples; the journal marks the row
+    as updated once the write buffer has written all of them.
+    """
+    journal.record(worksheet.spreadsheet.id, index, stage, message_id=status.get('id'),
+                   updates=[[ws.spreadsheet.id, ws.id, row, col, value] for ws, row, col, value in updates])
+    for update_worksheet, row, col, value in updates:
+        if update_worksheet is notary_worksheet:
+            update_notary_cell(row, col, value)
+        else:
+            sheet_buffer.update_cell(update_worksheet, row, col, value)
+
+
+def resume_write_backs(worksheet):
+    """Write back the rows a previous run sent or drafted without updating the sheet."""
+    worksheets = {(ws.spreadsheet.id, ws.id): ws for ws in (worksheet, notary_worksheet)}
+    entries = journal.pending_write_backs(worksheet.spreadsheet.id)
+    if entries:
+        print(f"\nFinishing the sheet updates of {len(entries)} rows from the last run")
+    for entry in entries:
+        updates = [(worksheets[(spreadsheet_id, worksheet_id)], row, col, value)
+                   for spreadsheet_id, worksheet_id, row, col, value in entry.get('updates', [])
+                   if (spreadsheet_id, worksheet_id) in worksheets]
+        write_back(worksheet, entry['row'], entry['stage'], {'id': entry.get('message_id')}, updates)
+
+
+def find_or_insert_notary(notary_first_name, notary_last_name, notary_email, notary_sheet_row):
+    """
+    Return (row number, row values, inserted) of a notary, adding `notary_sheet_row` when unknown.
+
+    A name written a bit differently matches a row holding `notary_email` too, so it
+    doesn't add a duplicate row; `AmbiguousNotary` is raised when several rows match about
+    as well, `UnconfirmedNotary` when the rows named like it have another email.
+    The lookup and the insert happen under the index lock, so two target sheets naming
+    the same new notary at once only add it once.
+    """
+    with notary_index.lock:
+        notary_sheet_index, existing_row = notary_index.match(
+            notary_first_name, notary_last_name, NOTARY_MATCH_THRESHOLD, NOTARY_MATCH_MARGIN, notary_email)
+        if notary_sheet_index:
+            return notary_sheet_index, existing_row, False
+        return insert_notary_row(notary_sheet_row), notary_sheet_row, True
+
+
+def notary_draft_created(worksheet, index, status, error=None):
+    if status:
+        write_back(worksheet, index, 'drafted', status,
+                   [(worksheet, index, 11, "draft"), (worksheet, index, 12, "3 emails sent already")])
+        summary.add("drafted")
+    elif error is not None:
+        print(f"Error creating draft for row {index}: {error}")
+        summary.error(f"{worksheet.spreadsheet.title} row {index}", error)
+
+
+def send_notary_email(sender, worksheet, index, notary_first_name, notary_last_name, fields, message=None):
+    """
+    Send the notary email of a target row from `sender`, then write the row back.
+
+    Runs in the scheduler thread of `sender`: the notary row is looked up again as rows
+    may have been inserted, or contact dates used, since the email was queued. When its
+    three contact dates are used by then, a draft is created instead. `message` is the
+    email already rendered for `sender`, as kept in the outbox; it is rendered here when None.
+    """
+    with notary_index.lock:
+        notary_sheet_index, notary_sheet_row = get_row_by_name(
+            notary_first_name, notary_last_name)
+        all_date = notary_sheet_row[11:14]
+        if all_date[-1] == "-":
+            date_col, date = update_date(notary_sheet_index, all_date)
+    if all_date[-1] != "-":
+        notary_draft_created(worksheet, index, create_draft(create_notary_message(user.email, *fields)))
+        return None
+    print(f"\nSending Email for {worksheet.spreadsheet.title} row {index} from {sender.email}...")
+    try:
+        status = send_email(message or sender.messages.notary(sender.email, *fields), sender)
+    except Exception as e:
+        # Gmail may have sent it all the same: the row is checked by hand, never sent twice
+        print(f"Email of row {index} not confirmed by Gmail: {e}")
+        summary.error(f"{worksheet.spreadsheet.title} row {index}", e)
+        write_back(worksheet, index, 'unconfirmed', {},
+                   [(worksheet, index, 11, "à vérifier"), (worksheet, index, 12, "Not confirmed by Gmail, check the Sent folder")])
+        return None
+    if status:
+        with notary_index.lock:
             notary_sheet_index, notary_sheet_row = get_row_by_name(
                 notary_first_name, notary_last_name)
-            if not notary_sheet_index:
-                worksheet.update_cell(index, 12, "New Notary added")
-                first_col = notary_worksheet.col_values(2)  # Get all values in the first column
+            updates = [(notary_worksheet, notary_sheet_index, date_col, date), (worksheet, index, 11, "envoyé")]
+            if notary_sheet_row[10] == "Not contacted":
+                updates.append((notary_worksheet, notary_sheet_index, 11, "Contacted / pending answer"))
+            write_back(worksheet, index, 'sent', status, updates)
+        summary.add("sent")
+    return status
+
+
+def spool_sender():
+    """Sender account the next outbox email is rendered for: the one with the most quota left once its outbox is sent."""
+    return max(send_scheduler.senders,
+               key=lambda sender: send_scheduler.remaining(sender) - outbox.pending_count(sender.email))
+
+
+def queue_notary_emails(spreadsheet: gspread.Spreadsheet, interactive=True, spool=False):
+    """
+    Prepare the "à envoyer" rows of a target sheet and hand them to `send_scheduler`.
+
+    Drafts are created right away. With `spool`, the emails are rendered into the outbox
+    instead, to be sent by `flush_outbox`. With `interactive` off, as when several sheets
+    are handled at once, each row is reported on one line instead of a full screen.
+    Returns the number of emails queued.
+    """
+    # Two threads preparing the same sheet would each email its notaries
+    with sheets_in_progress_lock:
+        if spreadsheet.id in sheets_in_progress:
+            raise RuntimeError(f"{spreadsheet.title} is already being handled")
+        sheets_in_progress.add(spreadsheet.id)
+    try:
+        return prepare_notary_emails(spreadsheet, interactive, spool)
+    finally:
+        with sheets_in_progress_lock:
+            sheets_in_progress.discard(spreadsheet.id)
+
+
+def prepare_notary_emails(spreadsheet, interactive, spool):
+    worksheet = api.execute('sheets_read', lambda: spreadsheet.get_worksheet(0),
+                            endpoint='sheets_read.get_worksheet')
+    queued = 0
+
+    def draft_created(index, status, error=None):
+        notary_draft_created(worksheet, index, status, error)
+
+    drafts = DraftBatch(user.gmail_service, user.email, draft_created, GMAIL_BATCH_SIZE, executor=api) if GMAIL_BATCH_DRAFTS else None
+    try:
+        resume_write_backs(worksheet)
+        for index, row in iter_target_rows(worksheet):
+            if row[10] == "à envoyer":
+                if journal.is_done(spreadsheet.id, index):
+                    # Sent by an earlier run, only its sheet update was missing
+                    continue
+                if not spool and outbox.is_pending(spreadsheet.id, index):
+                    # Sent by the next outbox flush, sending it now would email the notary twice
+                    print(f"\n{spreadsheet.title} row {index} : already waiting in the outbox")
+                    summary.add("in outbox")
+                    continue
+                metrics.add_rows()
+                notary_email = str(row[8]).split("\n")[0]
+                person_full_name = str(row[0]).strip()
+                words = person_full_name.split()
+                person_last_name = " ".join(
+                    [word for word in words if word.isupper()])
+                if not person_last_name.strip():
+                    continue
+                notary_full_name = str(row[5]).strip()
+                words = notary_full_name.split()
+                notary_last_name = " ".join(
+                    [word for word in words if word.isupper()])
+                notary_first_name = notary_full_name.replace(
+                    notary_last_name, "").strip()
+                if not notary_last_name.strip():
+                    continue
+                person_don = row[4]
+                try:
+                    with metrics.stage("notary_lookup"):
+                        notary_sheet_index, notary_sheet_row, inserted = find_or_insert_notary(
+                            notary_first_name, notary_last_name, notary_email,
+                            ["", notary_first_name, notary_last_name, "", "",
+                             "", row[5], row[6], row[8], row[7], "Not contacted", "-", "-", "-"])
+                except AmbiguousNotary as e:
+                    # Left "à envoyer" until the right notary row is picked by hand
+                    print(f"\n{spreadsheet.title} row {index} : {e}")
+                    sheet_buffer.update_cell(worksheet, index, 12, f"{e.label}, rows {', '.join(map(str, e.rows))}")
+                    summary.error(f"{spreadsheet.title} row {index}", e)
+                    continue
+                except PendingWrites as e:
+                    # Left "à envoyer", the notary is added by a later run
+                    print(f"\n{spreadsheet.title} row {index} : {e}")
+                    summary.error(f"{spreadsheet.title} row {index}", e)
+                    continue
+                # The notary is looked up again by the names of its row when the email is sent
+                matched_first_name, matched_last_name = notary_sheet_row[1], notary_sheet_row[2]
+                if inserted:
+                    sheet_buffer.update_cell(worksheet, index, 12, "New Notary added")
+
+                if notary_sheet_row[10] == "Not cooperating":
+                    sheet_buffer.update_cell(worksheet, index, 12, "Not cooperating")
+                    continue
+                all_date = notary_sheet_row[11:14]
+                if interactive:
+                    clear_display()
+                    print("\n")
+                    print_center(
+                        f"-------------------  Account : {user.email}  -------------------")
+                    print()
+                    print_center(
+                        "-------------------  Notary Email  -------------------")
+                    print()
+                    print_center(f"Google Sheet : {spreadsheet.title}")
+                    print()
+                    print_center(
+                        "-------------------  Sending All Emails       ------------------------\n\n")
+                    print(f"Index-File Row    :    {notary_sheet_index}")
+                    print(f"All Contact Date  :    {all_date}\n")
+                    print(f"Target Sheet Row  :    {index + 1}\n")
+                    print(f"Person Name       :    {person_full_name}")
+                    print(f"Person Last Name  :    {person_last_name}\n")
+                    print(f"Notary Name       :    {notary_full_name}")
+                    print(f"Notary Last Name  :    {notary_last_name}\n")
+                    print(f"DON               :    {person_don}")
+                    print(f"To                :    {notary_email}\n")
+                else:
+                    print(f"{spreadsheet.title} | row {index} | {notary_full_name} | {notary_email}")
+                fields = (notary_email, person_full_name, person_last_name, notary_last_name, person_don)
+                journal.record(spreadsheet.id, index, 'prepared')
+                if all_date[-1] != "-":
+                    message = create_notary_message(user.email, *fields)
+                    if drafts is not None:
+                        if interactive:
+                            print("\nQueuing Draft...")
+                        drafts.add(message, index)
+                    else:
+                        if interactive:
+                            countdown("Creating Draft in", 20)
+                            print("\nCreating Draft...")
+                        draft_created(index, create_draft(message))
+                elif spool:
+                    sender = spool_sender()
+                    entry_id = outbox.add(sender.email, spreadsheet.id, index, sender.messages.notary(sender.email, *fields),
+                                          {'title': spreadsheet.title, 'notary_first_name': matched_first_name,
+                                           'notary_last_name': matched_last_name, 'fields': fields})
+                    if entry_id is None:
+                        # Already waiting in the outbox
+                        continue
+                    queued += 1
+                    summary.add("spooled")
+                    if interactive:
+                        print(f"\nEmail added to the outbox of {sender.email}")
+                else:
+                    sender = send_scheduler.submit(
+                        lambda sender, index=index, first_name=matched_first_name, last_name=matched_last_name, fields=fields:
+                        send_notary_email(sender, worksheet, index, first_name, last_name, fields))
+                    if sender is None:
+                        # Left "à envoyer" for the next run
+                        print(f"\nRow {index} : every sender account reached its daily limit")
+                        summary.add("deferred")
+                        continue
+                    queued += 1
+                    if interactive:
+                        print(f"\nEmail Queued on {sender.email}")
+                        print(send_scheduler.status())
+                update_notary_cell(notary_sheet_index, 10, notary_email)
+    finally:
+        if drafts is not None:
+            with metrics.stage("draft"):
+                drafts.flush()
+    return queued
+
 
-                notary_sheet_row = ["", notary_first_name, notary_last_name, "", "",
-                                    "", row[5], row[6], row[8], row[7], "Not contacted", "-", "-", "-"]
-                notary_sheet_index = len(first_col) + 1
+def send_notary_emails(spreadsheet: gspread.Spreadsheet):
+    send_notary_emails_concurrently([spreadsheet], interactive=True)
+
+
+def send_notary_emails_concurrently(spreadsheets, interactive=False, spool=False):
+    """
+    Handle several target sheets at once, one thread per sheet.
+
+    The sheets share the notary index, the write buffer and `send_scheduler`, which
+    keeps every sender account of the session within its rate limit and daily quota.
+    With `spool`, the emails are only added to the outbox. A sheet given twice, by its
+    link and its key for instance, is only handled once.
+    """
+    metrics.start()
+    spreadsheets = unique_sheets(spreadsheets)
+    try:
+        load_notary_index()
+        with ThreadPoolExecutor(max_workers=min(len(spreadsheets), MAX_CONCURRENT_SHEETS)) as pool:
+            futures = {pool.submit(queue_notary_emails, spreadsheet, interactive, spool): spreadsheet
+                       for spreadsheet in spreadsheets}
+            for future in as_completed(futures):
+                try:
+                    queued = future.result()
+                    if len(spreadsheets) > 1:
+                        print(f"\n{futures[future].title} : {queued} emails queued")
+                except Exception as e:
+                    print(f"\nError with {futures[future].title} : {e}")
+                    summary.error(futures[future].title, e)
+        print("\nWaiting for the queued emails...\n")
+        with metrics.stage("send_queue"):
+            send_scheduler.join()
+        print("\nSuccess")
+    finally:
+        # Queued emails that were not sent yet stay "à envoyer" for the next run
+        send_scheduler.cancel()
+        # Never leave the sheet behind the emails already sent
+        with metrics.stage("sheet_writes"):
+            sheet_buffer.flush()
+        write_run_report("notary")
+
+
+def flush_outbox():
+    """
+    Send the pending emails of the outbox through `send_scheduler`, then write their rows back.
+
+    Each email goes out from the account it was rendered for, at its rate. The target
+    rows are read again first: an email whose row is no longer "à envoyer", as it was
+    sent another way since it was spooled, is dropped. Emails of accounts missing from
+    this session, or over their daily quota, stay pending for a later flush; a failed
+    one is tried again by the next flushes, up to `OUTBOX_MAX_ATTEMPTS` times.
+    Returns the number of emails queued.
+    """
+    metrics.start()
+    senders = {sender.email: sender for sender in send_scheduler.senders}
+    queued = 0
 
-                notary_worksheet.insert_row(
-                    notary_sheet_row, index=notary_sheet_index, inherit_from_before=True)
+    def send_entry(sender, entry, worksheet):
+        status = send_notary_email(sender, worksheet, entry.row, entry.meta['notary_first_name'],
+                                   entry.meta['notary_last_name'], entry.meta['fields'], Outbox.message(entry))
+        if status:
+            outbox.mark_sent(entry, status.get('id'))
+        elif journal.is_done(entry.spreadsheet_id, entry.row):
+            # Drafted, its notary having no contact date left, or left to be checked
+            outbox.mark_done(entry)
+        else:
+            outbox.mark_failed(entry, "not sent")
+        return status
 
-            if notary_sheet_row[10] == "Not cooperating":
-                worksheet.update_cell(index, 12, "Not cooperating")
+    try:
+        load_notary_index()
+        sheet_entries = {}
+        for entry in outbox.pending():
+            sheet_entries.setdefault(entry.spreadsheet_id, []).append(entry)
+        for spreadsheet_id, entries in sheet_entries.items():
+            title = entries[0].meta.get('title')
+            try:
+                spreadsheet = open_target_sheet(spreadsheet_id)
+                worksheet = api.execute('sheets_read', lambda: spreadsheet.get_worksheet(0),
+                                        endpoint='sheets_read.get_worksheet')
+                row_values = get_rows(worksheet, [entry.row for entry in entries])
+            except Exception as e:
+                print(f"\nError with {title} : {e}")
+                summary.error(title, e)
                 continue
-            all_date = notary_sheet_row[11:14]
-            clear_display()
-            print("\n")
-            print_center(
-                f"-------------------  Account : {user.email}  -------------------")
-            print()
-            print_center(
-                "-------------------  Notary Email  -------------------")
-            print()
-            print_center(f"Google Sheet : {spreadsheet.title}")
-            print()
-            print_center(
-                "-------------------  Sending All Emails       ------------------------\n\n")
-            print(f"Index-File Row    :    {notary_sheet_index}")
-            print(f"All Contact Date  :    {all_date}\n")
-            print(f"Target Sheet Row  :    {index + 1}\n")
-            print(f"Person Name       :    {person_full_name}")
-            print(f"Person Last Name  :    {person_last_name}\n")
-            print(f"Notary Name       :    {notary_full_name}")
-            print(f"Notary Last Name  :    {notary_last_name}\n")
-            print(f"DON               :    {person_don}")
-            print(f"To                :    {notary_email}\n")
-            if all_date[-1] != "-":
-                countdown("Creating Draft in", 20)
-                print("\nCreating Draft...")
-                message = create_notary_message(
-                    user.email, notary_email, person_full_name, person_last_name, notary_last_name, person_don)
-                status = create_draft(message)
-                if status:
-                    worksheet.update_cell(index, 11, "draft")
-                    worksheet.update_cell(index, 12, "3 emails sent already")
-            else:
-                countdown("Sending Email in", random.randint(120, 180))
-                print("\nSending Email...")
-                update_date(notary_sheet_index, all_date)
-                message = create_notary_message(
-                    user.email, notary_email, person_full_name, person_last_name, notary_last_name, person_don)
-                status = send_email(message)
-                if status:
-                    worksheet.update_cell(index, 11, "envoyé")
-                    if notary_sheet_row[10] == "Not contacted":
-                        notary_worksheet.update_cell(
-                            notary_sheet_index, 11, "Contacted / pending answer")
-            sleep(5)
-            print("\nSuccess")
-            notary_worksheet.update_cell(notary_sheet_index, 10, notary_email)
+            for entry in entries:
+                # The journal of this computer may not know the row, the sheet does
+                if journal.is_done(spreadsheet_id, entry.row) or row_values[entry.row][10:11] != ["à envoyer"]:
+                    outbox.mark_done(entry)
+                    continue
+                metrics.add_rows()
+                sender = senders.get(entry.sender)
+                if sender is None:
+                    print(f"\n{title} row {entry.row} : {entry.sender} is not a sender account of this session")
+                    summary.add("deferred")
+                    continue
+                if send_scheduler.submit(lambda sender, entry=entry, worksheet=worksheet:
+                                         send_entry(sender, entry, worksheet), sender) is None:
+                    # Left in the outbox for the next flush
+                    print(f"\n{title} row {entry.row} : {sender.email} reached its daily limit")
+                    summary.add("deferred")
+                    continue
+                queued += 1
+        print(f"\n{queued} emails of the outbox to send...\n")
+        with metrics.stage("send_queue"):
+            send_scheduler.join()
+        print("\nSuccess")
+    finally:
+        send_scheduler.cancel()
+        with metrics.stage("sheet_writes"):
+            sheet_buffer.flush()
+        write_run_report("outbox")
+    return queued
+
+
+def outbox_menu():
+    while True:
+        clear_display()
+        print("\n")
+        print_center(f"-------------------  Account : {user.email}  -------------------")
+        print()
+        print_center("-------------------  Outbox  -------------------")
+        print("\n")
+        counts = outbox.counts()
+        print(f"  Pending : {counts.get('pending', 0)}    Sent : {counts.get('sent', 0)}    "
+              f"Failed : {counts.get('failed', 0)}")
+        for sender in send_scheduler.senders:
+            print(f"  {sender.email}  :  {outbox.pending_count(sender.email)} pending")
+        print("\n")
+        print("1. Send Pending Emails")
+        print("2. Export Pending Emails (.eml)")
+        print("q. Main menu")
+        print("\nEnter your choice (1/2/q): ")
+        choice = read_choice("12q")
+        if choice == "q":
+            return
+        if choice == "1":
+            print("\nLoading...")
+            flush_outbox()
+            input("\n\nTask Completed\nPress Enter To Continue : ")
+        else:
+            directory = input("\nFolder to write the emails to : ").strip() or "outbox"
+            print(f"\n{len(outbox.export(directory))} emails written to {directory}")
+            input("Press Enter To Continue : ")
 
 
 def clear_display():
@@ -445,10 +961,11 @@ def clear_display():
 
 
 def countdown(text: str, t: int):
-    while t >= 0:
-        print(f"{text} : {t} sec", end="\r")
-        sleep(1)
-        t -= 1
+    with metrics.stage("countdown"):
+        while t >= 0:
+            print(f"{text} : {t} sec", end="\r")
+            sleep(1)
+            t -= 1
     print()
 
 
@@ -459,209 +976,483 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def unique_sheets(spreadsheets):
+    """`spreadsheets` without the ones given already, compared by id."""
+    unique = {}
+    for spreadsheet in spreadsheets:
+        unique.setdefault(spreadsheet.id, spreadsheet)
+    return list(unique.values())
+
+
+def open_target_sheet(link: str):
+    """Open a target sheet from its URL or its key."""
+    if link.startswith("http"):
+        return api.execute('sheets_read', lambda: gc.open_by_url(link), endpoint='sheets_read.open_by_url')
+    return api.execute('sheets_read', lambda: gc.open_by_key(link), endpoint='sheets_read.open_by_key')
+
+
 def notary_email():
-    clear_display()
-    print("\n")
-    print_center(
-        f"-------------------  Account : {user.email}  -------------------")
-    print()
-    print_center("-------------------  Notary Email  -------------------")
-    print("\n")
-    while True:
-        url = input("Target Google Sheet Link ( 0 : quit ) : ").strip()
-        if url == "0":
-            return
-        try:
-            spreadsheet = gc.open_by_url(url)
-            break
-        except SpreadsheetNotFound:
-            print("The specified spreadsheet was not found.")
-        except HttpError:
-            print("\nNo Internet Connection\n")
-        except Exception as e:
-            print(f"ERROR")
-    clear_display()
-    print("\n")
-    print_center(
-        f"-------------------  Account : {user.email}  -------------------")
-    print()
-    print_center("-------------------  Notary Email  -------------------")
-    print()
-    print_center(f"Google Sheet : {spreadsheet.title}")
-    print("\n")
-    print("1. Send Emails")
-    print("2. Change Google Sheet")
-    print("q. Main menu")
-    print("\nEnter your choice (1/2/q): ")
     while True:
-        if msvcrt.kbhit():
-            choice = msvcrt.getch().decode('utf-8').lower()
-            if choice == "1":
-                print("\nLoading...")
-                send_notary_emails(spreadsheet)
-                break
-            elif choice == "2":
-                notary_email()
-                break
-            elif choice == "q":
-                main()
+        clear_display()
+        print("\n")
+        print_center(
+            f"-------------------  Account : {user.email}  -------------------")
+        print()
+        print_center("-------------------  Notary Email  -------------------")
+        print("\n")
+        while True:
+            links = input("Target Google Sheet Links or keys, separated by spaces ( 0 : quit ) : ").replace(",", " ").split()
+            if links == ["0"]:
+                return
+            if not links:
+                continue
+            try:
+                spreadsheets = unique_sheets(open_target_sheet(link) for link in links)
                 break
-        sleep(0.1)
-    while msvcrt.kbhit():
-        msvcrt.getch()
-    print("\n")
-    print_center(
-        f"-------------------  Account : {user.email}  -------------------")
-    print()
-    print_center("-------------------  Notary Email  -------------------")
-    print()
-    input("\n\nTask Completed\nPress Enter To Continue : ")
-    main()
-
+            except SpreadsheetNotFound:
+                print("The specified spreadsheet was not found.")
+            except HttpError:
+                print("\nNo Internet Connection\n")
+            except Exception as e:
+                print(f"ERROR")
+        clear_display()
+        print("\n")
+        print_center(
+            f"-------------------  Account : {user.email}  -------------------")
+        print()
+        print_center("-------------------  Notary Email  -------------------")
+        print()
+        for spreadsheet in spreadsheets:
+            print_center(f"Google Sheet : {spreadsheet.title}")
+        print("\n")
+        print("1. Send Emails")
+        print("2. Change Google Sheet")
+        print("3. Prepare Emails in Outbox")
+        print("q. Main menu")
+        print("\nEnter your choice (1/2/3/q): ")
+        choice = read_choice("123q")
+        if choice == "2":
+            continue
+        if choice == "q":
+            return
+        print("\nLoading...")
+        if choice == "3":
+            send_notary_emails_concurrently(spreadsheets, spool=True)
+        elif len(spreadsheets) == 1:
+            send_notary_emails(spreadsheets[0])
+        else:
+            send_notary_emails_concurrently(spreadsheets)
+        print("\n")
+        print_center(
+            f"-------------------  Account : {user.email}  -------------------")
+        print()
+        print_center("-------------------  Notary Email  -------------------")
+        print()
+        input("\n\nTask Completed\nPress Enter To Continue : ")
+        return
+
+
+def ask_invoice_rows(title):
+    """
+    Ask for the invoice sheet rows to handle, returns (rows, last).
 
-def client_email():
+    Rows up to the header (0 included) end the list and quit the menu: `last` is True
+    when one was given.
+    """
     clear_display()
     print("\n")
     print_center(f"-------------------  Account : {user.email}  -------------------")
     print()
-    print_center("-------------------  Client Email  -------------------")
+    print_center(f"-------------------  {title}  -------------------")
     print()
-    user_input = input(f"Enter a list of rows separated by commas ( 0 : quit ) : ")
-    input_list = user_input.split(",")
-    spreadsheet = gc.open_by_key(INVOICE_SHEET_KEY)
-    worksheet = spreadsheet.get_worksheet(0)
-    row_value = worksheet.row_values(row)
-    primary_header_row = get_filled_row_values(worksheet,4)
-    secondary_header_row = get_filled_row_values(worksheet,5)
-    for item in input_list:
-        item = item.strip()
-        try:
-            row = int(item)
-        except:
-            print("Invalid input. Please enter only integers separated by commas.")
-            continue
-        if row <= 5:
-            return
-        try:
-            print(f"\n\nCreating Draft for row {row}")
-            person_full_name = row_value[find_column_index(primary_header_row, secondary_header_row,"Nom/Prénom")]
-            amount_found_by_us = row_value[find_column_index(primary_header_row, secondary_header_row,"Somme retrouvée")]
-            amount_with_tex = row_value[find_column_index(primary_header_row, secondary_header_row,"Commission TTC (notaire déj payé)")]
-            amount_after_fee = row_value[find_column_index(primary_header_row, secondary_header_row,"Somme à verser (incl cas spécifique EON)")]
-            message = create_client_message(user.email, "", person_full_name, amount_found_by_us, amount_with_tex, amount_after_fee)
-            status = create_draft(message)
+    user_input = input(f"Enter a list of rows separated by commas, ranges like 120-180 allowed ( 0 : quit ) : ")
+    input_list = parse_row_list(user_input)
+    quit_index = next((i for i, row in enumerate(input_list) if row <= 5), None)
+    return input_list[:quit_index], quit_index is not None
+
+
+def open_invoice_sheet(columns):
+    """First worksheet of the invoice sheet and its `ColumnSchema`; raises SchemaError."""
+    spreadsheet = api.execute('sheets_read', lambda: gc.open_by_key(INVOICE_SHEET_KEY),
+                              endpoint='sheets_read.open_by_key')
+    worksheet = api.execute('sheets_read', lambda: spreadsheet.get_worksheet(0),
+                            endpoint='sheets_read.get_worksheet')
+    return worksheet, ColumnSchema(*get_filled_rows(worksheet, 4, 5), columns)
+
+
+def create_client_drafts(rows):
+    metrics.start()
+    try:
+        worksheet, schema = open_invoice_sheet(CLIENT_COLUMNS)
+        all_row_values = get_rows(worksheet, rows)
+
+        def draft_created(row, status, error=None):
             if status:
-                input("\nSuccess    ")
+                print(f"{row} Success")
+                summary.add("drafted")
             else:
-                input("\nError      ")
-            client_email()
-        except Exception as e:
-            print(f"ERROR : {e}")
-    input("\nPress Enter to Continue :")
-    client_email()
-
+                print(f"{row} Error {error or ''}")
+                summary.error(f"row {row}", error or "draft not created")
 
-def facturation():
-    clear_display()
-    print("\n")
-    print_center(
-        f"-------------------  Account : {user.email}  -------------------")
-    print()
-    print_center("-------------------  Facturation  -------------------")
-    print()
-    user_input = input(f"Enter a list of rows separated by commas ( 0 : quit ) : ")
-    input_list = user_input.split(",")
-    spreadsheet = gc.open_by_key(INVOICE_SHEET_KEY)
-    worksheet = spreadsheet.get_worksheet(0)
-    primary_header_row = get_filled_row_values(worksheet,4)
-    secondary_header_row = get_filled_row_values(worksheet,5)
-    for item in input_list:
-        item = item.strip()
-        try:
-            row = int(item)
-        except:
-            print("Invalid input. Please enter only integers separated by commas.")
-            continue
-        if row <= 5:
-            return
-        try:
-            print(f"\n\nCreating Draft for row {row}")
-            row_value = worksheet.row_values(row)
-            person_full_name = row_value[find_column_index(primary_header_row, secondary_header_row,"Nom/Prénom")]
-            facture_number = row_value[find_column_index(primary_header_row, secondary_header_row,"# Factures LD","LD")]
-            ht = row_value[find_column_index(primary_header_row, secondary_header_row,"Commission HT","LD")]
-            tva = row_value[find_column_index(primary_header_row, secondary_header_row,"TVA Commission","LD")]
-            tcc = row_value[find_column_index(primary_header_row, secondary_header_row,"Commission TTC","LD")]
+        drafts = DraftBatch(user.gmail_service, user.email, draft_created, GMAIL_BATCH_SIZE, executor=api) if GMAIL_BATCH_DRAFTS else None
+        for row in rows:
+            metrics.add_rows()
             try:
-                paid_date = datetime.strptime(row_value[find_column_index(primary_header_row, secondary_header_row,"Date paiement","LD")], '%d/%m/%Y').strftime('%d %B %Y')
-            except:
-                print("No Paiement Date")
-                paid_date = ""
-            message = create_facture_message(user.email, "", person_full_name)
-            status = create_draft(message)
+                print(f"\n\nCreating Draft for row {row}")
+                fields = schema.row(all_row_values[row])
+                message = create_client_message(user.email, "", fields.person_full_name, fields.amount_found_by_us, fields.amount_with_tex, fields.amount_after_fee)
+                if drafts is not None:
+                    drafts.add(message, row)
+                else:
+                    draft_created(row, create_draft(message))
+            except Exception as e:
+                print(f"{row} ERROR : {e}")
+                summary.error(f"row {row}", e)
+        if drafts is not None:
+            with metrics.stage("draft"):
+                drafts.flush()
+    finally:
+        write_run_report("client")
+
+
+def invoice_renderer():
+    """INVOICE_RENDERER, or "pdf" where Word cannot be driven."""
+    return INVOICE_RENDERER if convert is not None else "pdf"
+
+
+def create_invoices(rows):
+    metrics.start()
+    try:
+        # A broken template is reported before any draft is created
+        if invoice_renderer() == "docx":
+            load_template(resource_path("template.docx"))
+        worksheet, schema = open_invoice_sheet(FACTURE_COLUMNS)
+        all_row_values = get_rows(worksheet, rows)
+        invoices = {}
+        drafted = []
+
+        def draft_created(row, status, error=None):
             if status:
-                print(f"Creating Invoice for row {row}")
-                create_facture_files(person_full_name, facture_number, ht, tva, tcc, paid_date)
                 print(f"{row} Success")
+                summary.add("drafted")
+                drafted.append(row)
             else:
-                print(f"{row} Error")
+                print(f"{row} Error {error or ''}")
+                summary.error(f"row {row}", error or "draft not created")
+
+        drafts = DraftBatch(user.gmail_service, user.email, draft_created, GMAIL_BATCH_SIZE, executor=api) if GMAIL_BATCH_DRAFTS else None
+        for row in rows:
+            metrics.add_rows()
+            try:
+                print(f"\n\nCreating Draft for row {row}")
+                fields = schema.row(all_row_values[row])
+                try:
+                    paid_date = datetime.strptime(fields.paid_date, '%d/%m/%Y').strftime('%d %B %Y')
+                except:
+                    print("No Paiement Date")
+                    paid_date = ""
+                invoices[row] = (fields.person_full_name, fields.facture_number, fields.ht, fields.tva, fields.tcc, paid_date)
+                message = create_facture_message(user.email, "", fields.person_full_name)
+                if drafts is not None:
+                    drafts.add(message, row)
+                else:
+                    draft_created(row, create_draft(message))
+            except Exception as e:
+                print(f"{row} ERROR : {e}")
+                summary.error(f"row {row}", e)
+        if drafts is not None:
+            with metrics.stage("draft"):
+                drafts.flush()
+        if not drafted:
+            return
+        # The invoices of every drafted row are created in one batch
+        print(f"\n\nCreating {len(drafted)} Invoices...")
+        date = datetime.now().date().strftime('%d %B %Y')
+        try:
+            batch = [(date, *invoices[row]) for row in sorted(drafted)]
+            with metrics.stage("invoice_files"):
+                if invoice_renderer() == "pdf":
+                    generate_pdf_invoices(resource_path("template.docx"), batch)
+                else:
+                    generate_invoices(resource_path("template.docx"), batch, convert, INVOICE_WORKERS)
+            summary.add("invoiced", len(drafted))
+            print("Invoices Success")
         except Exception as e:
-            print(f"{row} ERROR : {e}")
-    input("\n\nPress Enter to Continue :")
-    facturation()
+            print(f"Invoices ERROR : {e}")
+            summary.error("invoices", e)
+    finally:
+        write_run_report("facturation")
 
 
-def main():
-    clear_display()
-    print("\n")
-    print_center(
-        f"-------------------  Account : {user.email}  -------------------")
-    print("\n")
-    print("1. Notary Email")
-    print("2. Client Email")
-    print("3. Facturation")
-    print("\nEnter your choice (1/2/3): ")
+def client_email():
     while True:
-        if msvcrt.kbhit():
-            choice = msvcrt.getch().decode('utf-8').lower()
-            if choice == "1":
-                print("\nLoading...")
-                notary_email()
-                break
-            elif choice == "2":
-                print("\nLoading...")
-                client_email()
-                break
-            elif choice == "3":
-                print("\nLoading...")
-                facturation()
-                break
-        sleep(0.1)
-    while msvcrt.kbhit():
-        msvcrt.getch()
-    main()
+        rows, last = ask_invoice_rows("Client Email")
+        if not rows and last:
+            return
+        try:
+            create_client_drafts(rows)
+        except SchemaError as e:
+            input(f"\n{e}\nPress Enter to Continue :")
+            return
+        if last:
+            return
+        input("\nPress Enter to Continue :")
 
 
-load_dotenv(dotenv_path=resource_path(".env"))
-try:
-    client_secret = os.environ["CLIENT_SECRET"]
-    client_secret_info = json.loads(client_secret)
-except:
-    input("CLIENT_SECRET environment variable is not set.")
-    sys.exit(1)
+def facturation():
+    while True:
+        rows, last = ask_invoice_rows("Facturation")
+        if not rows and last:
+            return
+        try:
+            create_invoices(rows)
+        except (SchemaError, TemplateError) as e:
+            input(f"\n{e}\nPress Enter to Continue :")
+            return
+        if last:
+            return
+        input("\n\nPress Enter to Continue :")
+
+
+def sender_accounts():
+    global send_scheduler
+    while True:
+        clear_display()
+        print("\n")
+        print_center(f"-------------------  Account : {user.email}  -------------------")
+        print()
+        print_center("-------------------  Sender Accounts  -------------------")
+        print("\n")
+        for sender in send_scheduler.senders:
+            print(f"  {sender.email}  :  {send_scheduler.sent_today(sender)} / {send_scheduler.daily_limit} sent today")
+        print("\n")
+        print("1. Add an account")
+        print("q. Main menu")
+        print("\nEnter your choice (1/q): ")
+        if read_choice("1q") == "q":
+            return
+        print("\nLoading...")
+        if user.add_sender():
+            send_scheduler = load_sender_pool()
+        else:
+            input("Press Enter To Continue : ")
+
+
+def main(startup_time=None):
+    """Main menu; every action returns to it, so a long session doesn't grow the stack."""
+    actions = {"1": notary_email, "2": client_email, "3": facturation, "4": sender_accounts, "5": outbox_menu}
+    while True:
+        clear_display()
+        print("\n")
+        print_center(
+            f"-------------------  Account : {user.email}  -------------------")
+        if startup_time is not None:
+            print_center(f"Ready in {startup_time:.1f} sec")
+            startup_time = None
+        print("\n")
+        print("1. Notary Email")
+        print("2. Client Email")
+        print("3. Facturation")
+        print("4. Sender Accounts")
+        print("5. Outbox")
+        print("\nEnter your choice (1/2/3/4/5): ")
+        choice = read_choice(actions)
+        if choice not in ("4", "5"):
+            print("\nLoading...")
+        actions[choice]()
+
+
+def start_session():
+    """Shared state of a logged-in session, interactive or not."""
+    global journal, snapshots, outbox, message_factory, send_scheduler, gc
+    journal = JobJournal(JOURNAL_PATH)
+    outbox = Outbox(OUTBOX_PATH, OUTBOX_MAX_ATTEMPTS)
+    snapshots = SheetSnapshotStore(SNAPSHOT_PATH)
+    sheet_buffer.on_flush = journal.cells_written
+    message_factory = MessageFactory(user.signature, resource_path("attachment.pdf"))
+    send_scheduler = load_sender_pool()
+    gc = user.gc
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="auto_email",
+        description="Without a command, the interactive menu is shown. With one, the task runs "
+                    "with the saved account and a JSON summary is printed at the end.")
+    parser.add_argument("--summary", metavar="PATH", help="also write the JSON summary to PATH")
+    commands = parser.add_subparsers(dest="command")
+    notary = commands.add_parser("notary", help="send the notary emails of target sheets")
+    notary.add_argument("--sheet", action="append", required=True, metavar="URL",
+                        help="target Google Sheet link or key, repeat for several sheets")
+    notary.add_argument("--spool", action="store_true",
+                        help="only add the emails to the outbox, to be sent by the outbox command")
+    outbox_command = commands.add_parser("outbox", help="send the pending emails of the outbox")
+    outbox_command.add_argument("--export", metavar="DIR",
+                                help="write the pending emails to DIR as .eml files instead of sending them")
+    client = commands.add_parser("client", help="create the client email drafts of invoice sheet rows")
+    client.add_argument("--rows", required=True, help="rows separated by commas, ranges like 120-180 allowed")
+    facture = commands.add_parser("facturation", help="create the invoice drafts and files of invoice sheet rows")
+    facture.add_argument("--rows", required=True, help="rows separated by commas, ranges like 120-180 allowed")
+    return parser.parse_args(argv)
+
+
+def run_command(args):
+    """Run a command-line task without any prompt; returns the exit code."""
+    global user
+    started = perf_counter()
+    try:
+        user = GoogleServices(interactive=False)
+        if not user.use_account():
+            raise RuntimeError(f"{user.email} is not an intern account")
+        start_session()
+        if args.command == "notary":
+            send_notary_emails_concurrently(unique_sheets(open_target_sheet(link) for link in args.sheet),
+                                            spool=args.spool)
+        elif args.command == "outbox":
+            if args.export:
+                print(f"{len(outbox.export(args.export))} emails written to {args.export}")
+            else:
+                flush_outbox()
+        else:
+            rows = parse_row_list(args.rows)
+            if any(row <= 5 for row in rows):
+                raise ValueError("Rows up to 5 are the invoice sheet header")
+            if args.command == "client":
+                create_client_drafts(rows)
+            else:
+                create_invoices(rows)
+    except Exception as e:
+        print(f"\nERROR : {e}")
+        summary.error(args.command, e)
+    finally:
+        sheet_buffer.flush()
+    result = {
+        'command': args.command,
+        'account': user.email if user is not None else None,
+        'duration': round(perf_counter() - started, 1),
+        **summary.as_dict(),
+        'metrics': metrics.report(),
+    }
+    output = json.dumps(result, ensure_ascii=False)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(output + "\n")
+    print(output)
+    return 1 if result['errors'] else 0
+
+
+def load_client_secret():
+    """OAuth client of the app, from the CLIENT_SECRET variable of the environment or of .env."""
+    global client_secret_info
+    load_dotenv(dotenv_path=resource_path(".env"))
+    try:
+        client_secret = os.environ["CLIENT_SECRET"]
+        client_secret_info = json.loads(client_secret)
+    except:
+        input("CLIENT_SECRET environment variable is not set.")
+        sys.exit(1)
+
 
 NOTARY_SHEET_KEY = "1VBT_7wkJ3sIgRYX7LLkkX84BSkNUMhu2_QCOJZXp9Ds"
 INVOICE_SHEET_KEY = "1KlKBSzyFDprXy_L8Gy0UDfRfMdmpl-YZnZErg0yiATg"
-locale.setlocale(locale.LC_TIME, 'fr_FR')
+WRITE_BUFFER_MAX_ROWS = 20
+WRITE_BUFFER_INTERVAL = 60
+# Latency, quota and error counters of the current task, written to RUN_REPORT_PATH
+# (and the same name with .csv) at its end
+metrics = Metrics()
+RUN_REPORT_PATH = "run_report.json"
+api = ApiExecutor(metrics=metrics)
+# Connection pool and token refresh shared by every Google client; Sheets responses and
+# Gmail/Drive ones alike are counted in the metrics
+transport = GoogleTransport(on_response=count_response_bytes)
+# Stages of every notary row handled, to resume an interrupted run
+JOURNAL_PATH = "send_journal.jsonl"
+# Local copies of the target and notary sheets, reused while they are unchanged
+SNAPSHOT_PATH = "sheet_snapshots.db"
+# Notary emails rendered ahead of sending, tried OUTBOX_MAX_ATTEMPTS flushes at most
+OUTBOX_PATH = "outbox.db"
+OUTBOX_MAX_ATTEMPTS = 3
+sheet_buffer = SheetWriteBuffer(WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_INTERVAL, executor=api)
+filled_rows_cache = {}
+# Ids of the target sheets being prepared, each by one thread only
+sheets_in_progress = set()
+sheets_in_progress_lock = threading.Lock()
+# Notary emails are sent one every SEND_INTERVAL ± SEND_JITTER seconds
+SEND_INTERVAL = 150
+SEND_JITTER = 30
+# Emails each sender account may send per day, counted across runs in SENDER_QUOTA_PATH
+SENDER_DAILY_LIMIT = 400
+SENDER_QUOTA_PATH = "sender_quota.json"
+# Seconds the result of each email sent stays on screen
+EMAIL_PAUSE = 2
+# Target sheets prepared at the same time; their emails still share send_scheduler
+MAX_CONCURRENT_SHEETS = 4
+# Group drafts.create calls into Gmail batch requests
+GMAIL_BATCH_DRAFTS = False
+GMAIL_BATCH_SIZE = 50
+# Target sheets are read STREAM_BLOCK_ROWS rows at a time, columns A, E-I and K only
+STREAM_BLOCK_ROWS = 500
+NOTARY_FLOW_COLUMNS = [1, 5, 6, 7, 8, 9, 11]
+# Notary names scoring at least NOTARY_MATCH_THRESHOLD (0-1) against a row of the notary
+# sheet match it when the row holds the notary email too, unless another row scores within
+# NOTARY_MATCH_MARGIN of it; only exact names match without the email
+NOTARY_MATCH_THRESHOLD = 0.85
+NOTARY_MATCH_MARGIN = 0.05
+# Processes filling the invoice DOCX files of a batch
+INVOICE_WORKERS = 4
+# "docx" fills template.docx and converts it with Word, "pdf" draws the PDF directly (no Word
+# needed, and used wherever docx2pdf is not installed)
+INVOICE_RENDERER = "docx"
+# Invoice sheet columns, as {field: (secondary heading, primary heading)}
+CLIENT_COLUMNS = {
+    "person_full_name": ("Nom/Prénom", None),
+    "amount_found_by_us": ("Somme retrouvée", None),
+    "amount_with_tex": ("Commission TTC (notaire déj payé)", None),
+    "amount_after_fee": ("Somme à verser (incl cas spécifique EON)", None),
+}
+FACTURE_COLUMNS = {
+    "person_full_name": ("Nom/Prénom", None),
+    "facture_number": ("# Factures LD", "LD"),
+    "ht": ("Commission HT", "LD"),
+    "tva": ("TVA Commission", "LD"),
+    "tcc": ("Commission TTC", "LD"),
+    "paid_date": ("Date paiement", "LD"),
+}
+# French month names in the invoices; the locale is named differently on Linux
+for name in ('fr_FR', 'fr_FR.UTF-8', 'fr_FR.utf8'):
+    try:
+        locale.setlocale(locale.LC_TIME, name)
+        break
+    except locale.Error:
+        pass
+notary_worksheet = None
+user = None
+# Set by load_client_secret in the interactive menu, only needed to log in
+client_secret_info = None
+summary = RunSummary()
 if __name__ == "__main__":
+    # The invoice workers of the compiled executable start from it too
+    multiprocessing.freeze_support()
+    args = parse_args()
+    if args.command:
+        # Only the saved token is used, refreshing it doesn't need the OAuth client
+        sys.exit(run_command(args))
+    load_client_secret()
     try:
-        check_for_updates()
+        started = perf_counter()
+        print("Checking for updates...")
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            update_available = pool.submit(is_update_available)
+            user = GoogleServices()
+            if update_available.result():
+                start_update()
         print("Running the latest version.")
-        user = GoogleServices()
-        gc = gspread.authorize(user.creds)
-        notary_sheet = gc.open_by_key(NOTARY_SHEET_KEY)
-        notary_worksheet = notary_sheet.get_worksheet(0)
-        main()
+        # Time spent on the account prompt is not part of the startup time
+        login_started = perf_counter()
+        user.login()
+        started += perf_counter() - login_started
+        start_session()
+        main(perf_counter() - started)
     except Exception as e:
         print(e)
         print("\n\n!! Error !!")
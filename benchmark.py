@@ -0,0 +1,508 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import tracemalloc
+from collections import Counter
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+from gspread.exceptions import SpreadsheetNotFound
+from gspread.utils import a1_range_to_grid_range, extract_id_from_url
+
+import auto_email
+from notary_index import AmbiguousNotary
+from run_summary import RunSummary
+
+TARGET_SHEET_KEY = "benchmark-target"
+FIRST_NAMES = ["Jean", "Marie", "Pierre", "Anne", "Jean-Pierre", "Claire", "Louis", "Sophie", "Paul",
+               "Isabelle", "Jacques", "Nathalie", "Michel", "Catherine", "François", "Hélène", "Marc",
+               "Jean-Luc", "Sylvie", "Philippe", "Agnès", "Olivier", "Françoise", "Éric", "Christine"]
+SYLLABLES = ["MAR", "TIN", "DU", "RAND", "BER", "NARD", "LE", "FEB", "VRE", "ROU", "SSEL", "GAR",
+             "NIER", "FON", "TAINE", "MO", "REAU", "LAU", "RENT", "GI", "RARD", "BON", "NET", "CHE",
+             "VAL", "LIER", "PER", "RIN", "BLAN", "CHARD"]
+# Headers of rows 4 and 5 of the invoice sheet, as auto_email.CLIENT_COLUMNS and FACTURE_COLUMNS expect them
+INVOICE_HEADERS = [
+    ("", "Nom/Prénom"), ("", "Somme retrouvée"), ("", "Commission TTC (notaire déj payé)"),
+    ("", "Somme à verser (incl cas spécifique EON)"), ("LD", "# Factures LD"), ("LD", "Commission HT"),
+    ("LD", "TVA Commission"), ("LD", "Commission TTC"), ("LD", "Date paiement"),
+]
+FLOWS = ("notary", "spool", "client", "facturation", "lookup")
+
+
+class QuotaError(Exception):
+    """429 answered by a fake service, retried by `ApiExecutor` like the real one."""
+
+    def __init__(self, endpoint):
+        super().__init__(f"Quota exceeded for {endpoint}")
+        self.response = SimpleNamespace(status_code=429, headers={'Retry-After': '0'})
+
+
+class FakeNetwork:
+    """
+    Latency and quota errors of the fake services, and the calls they received.
+
+    Attributes:
+        latency (float): Seconds every call takes.
+        jitter (float): Random extra latency of a call, up to this many seconds.
+        error_rate (float): Share of the calls answered with a `QuotaError`.
+        calls (Counter): Endpoint -> calls received, failed ones included.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            sleep(delay)
+        if failed:
+            raise QuotaError(endpoint)
+
+
+class FakeRequest:
+    """googleapiclient request: `execute()` goes through the fake network and returns `response()`."""
+
+    def __init__(self, network, method_id, response, body=None):
+        self.network = network
+        self.methodId = method_id
+        self.response = response
+        self.body = json.dumps(body) if body is not None else None
+
+    def execute(self):
+        self.network.call(self.methodId)
+        return self.response()
+
+
+class FakeGmail:
+    """The `users().messages().send` and `users().drafts().create` resources of the Gmail API."""
+
+    def __init__(self, network, email):
+        self.network = network
+        self.email = email
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _created(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+            return {'id': f"{kind}-{self.counts[kind]}"}
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return SimpleNamespace(send=lambda userId, body: FakeRequest(
+            self.network, 'gmail.users.messages.send', lambda: self._created('sent'), body))
+
+    def drafts(self):
+        return SimpleNamespace(create=lambda userId, body: FakeRequest(
+            self.network, 'gmail.users.drafts.create', lambda: self._created('drafts'), body))
+
+    def getProfile(self, userId):
+        return FakeRequest(self.network, 'gmail.users.getProfile', lambda: {'emailAddress': self.email})
+
+
+class FakeDrive:
+    """The `files().get(fields='version')` resource of the Drive API, over the fake spreadsheets."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None):
+        return FakeRequest(self.client.network, 'drive.files.get',
+                           lambda: {'version': str(self.client.spreadsheets[fileId].version)})
+
+
+class FakeWorksheet:
+    """
+    In-memory gspread `Worksheet`, with the calls the flows make.
+
+    Every write bumps the Drive version of its spreadsheet, as on Google Sheets.
+
+    Attributes:
+        spreadsheet (FakeSpreadsheet): Spreadsheet the worksheet belongs to.
+        rows (list): Cell values, `rows[0]` being row 1.
+    """
+
+    def __init__(self, spreadsheet, worksheet_id, title, rows):
+        self.spreadsheet = spreadsheet
+        self.id = worksheet_id
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def _call(self, endpoint):
+        self.spreadsheet.client.network.call(endpoint)
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = value
+
+    def _range(self, a1_range):
+        grid = a1_range_to_grid_range(a1_range.split("!")[-1])
+        return (grid.get('startRowIndex', 0), grid.get('endRowIndex', len(self.rows)),
+                grid.get('startColumnIndex', 0), grid.get('endColumnIndex'))
+
+    def get_all_values(self):
+        self._call('sheets.values.get')
+        with self._lock:
+            width = max(map(len, self.rows), default=0)
+            return [row + [""] * (width - len(row)) for row in self.rows]
+
+    def col_values(self, col):
+        self._call('sheets.values.get')
+        with self._lock:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def batch_get(self, ranges):
+        self._call('sheets.values.batchGet')
+        value_ranges = []
+        with self._lock:
+            for a1_range in ranges:
+                first_row, last_row, first_col, last_col = self._range(a1_range)
+                values = [list(row[first_col:last_col]) for row in self.rows[first_row:last_row]]
+                # Like the API, empty trailing rows are left out
+                while values and not any(values[-1]):
+                    values.pop()
+                value_ranges.append(values)
+        return value_ranges
+
+    def batch_update(self, data, value_input_option=None):
+        self._call('sheets.values.batchUpdate')
+        with self._lock:
+            for update in data:
+                first_row, _, first_col, _ = self._range(update['range'])
+                for row_offset, values in enumerate(update['values']):
+                    for col_offset, value in enumerate(values):
+                        self._set(first_row + row_offset + 1, first_col + col_offset + 1, value)
+            self.spreadsheet.version += 1
+
+    def update_cell(self, row, col, value):
+        self._call('sheets.values.update')
+        with self._lock:
+            self._set(row, col, value)
+            self.spreadsheet.version += 1
+
+    def insert_row(self, values, index=1, inherit_from_before=False):
+        self._call('sheets.batchUpdate')
+        with self._lock:
+            self.rows.insert(index - 1, list(values))
+            self.spreadsheet.version += 1
+
+
+class FakeSpreadsheet:
+    """In-memory gspread `Spreadsheet` holding one worksheet."""
+
+    def __init__(self, client, key, title, rows):
+        self.client = client
+        self.id = key
+        self.title = title
+        self.version = 1
+        self.worksheet = FakeWorksheet(self, 0, "Sheet1", rows)
+
+    def get_worksheet(self, index):
+        self.client.network.call('sheets.get')
+        return self.worksheet
+
+    def fetch_sheet_metadata(self, params=None):
+        self.client.network.call('sheets.get')
+        first_row, last_row, _, _ = self.worksheet._range(params['ranges'])
+        with self.worksheet._lock:
+            rows = self.worksheet.rows[first_row:last_row]
+            row_data = [{'values': [{'formattedValue': value} for value in row]} for row in rows]
+        return {'sheets': [{'merges': [], 'data': [{'startRow': first_row, 'rowData': row_data}]}]}
+
+
+class FakeClient:
+    """In-memory gspread `Client`; spreadsheets are added with `add`."""
+
+    def __init__(self, network):
+        self.network = network
+        self.spreadsheets = {}
+
+    def add(self, key, title, rows):
+        self.spreadsheets[key] = FakeSpreadsheet(self, key, title, rows)
+        return self.spreadsheets[key]
+
+    def open_by_key(self, key):
+        self.network.call('sheets.get')
+        if key not in self.spreadsheets:
+            raise SpreadsheetNotFound(key)
+        return self.spreadsheets[key]
+
+    def open_by_url(self, url):
+        return self.open_by_key(extract_id_from_url(url))
+
+
+class FakeUser:
+    """Stands for `GoogleServices`: one account, its fake clients and no other sender account."""
+
+    def __init__(self, network, client, email="bench@example.com"):
+        self.email = email
+        self.gc = client
+        self.gmail_service = FakeGmail(network, email)
+        self.drive_service = FakeDrive(client)
+        self.sender_name = "Bench"
+        self.phone = "6 00 00 00 00"
+        self.signature = auto_email.render_signature(self.sender_name, self.phone)
+        self.interns = {email: {'Name': self.sender_name, 'Phone': self.phone}}
+
+    def load_sender_credentials(self, email):
+        return None
+
+
+def generate_names(count, rng):
+    """`count` distinct (first name, LAST NAME) pairs."""
+    names = set()
+    while len(names) < count:
+        last_name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add((rng.choice(FIRST_NAMES), last_name))
+    return sorted(names)
+
+
+def notary_sheet_rows(notaries, rng):
+    rows = [["", "Prénom", "Nom", "", "", "", "Notaire", "Adresse", "Email", "Téléphone", "Statut",
+             "Contact 1", "Contact 2", "Contact 3"]]
+    for first_name, last_name in notaries:
+        status = rng.choices(["Contacted / pending answer", "Not contacted", "Not cooperating"], [60, 37, 3])[0]
+        # A notary contacted three times already gets a draft instead of an email
+        used = rng.choices([0, 1, 2, 3], [40, 30, 20, 10])[0]
+        dates = ["01/01/2024"] * used + ["-"] * (3 - used)
+        rows.append(["", first_name, last_name, "", "", "", f"{first_name} {last_name}",
+                     "1 place du Martroi, 45000 Orléans", f"{first_name}.{last_name}@notaires.fr".lower(),
+                     "02 38 00 00 00", status, *dates])
+    return rows
+
+
+def misspell(first_name, last_name, rng):
+    """The name of a notary written a bit differently, as on the target sheets."""
+    change = rng.randrange(3)
+    if change == 0 and "-" in first_name:
+        return first_name.replace("-", " "), last_name
+    if change == 1:
+        return f"{first_name} {rng.choice(FIRST_NAMES)}", last_name
+    position = rng.randrange(1, len(last_name))
+    return first_name, last_name[:position] + rng.choice("AEIOU") + last_name[position + 1:]
+
+
+def target_sheet_rows(count, notaries, rng):
+    """Target sheet rows: 90% "à envoyer", naming known notaries, misspelled ones (10%) or new ones (5%)."""
+    rows = [["Nom/Prénom", "", "", "", "DON", "Notaire", "Adresse", "Téléphone", "Email", "", "Statut", "Commentaire"]]
+    new_notaries = generate_names(max(1, count // 20), random.Random(rng.random()))
+    for _ in range(count):
+        first_name, last_name = rng.choice(notaries)
+        kind = rng.random()
+        if kind < 0.05:
+            first_name, last_name = rng.choice(new_notaries)
+        # A misspelled notary still has the email of the notary sheet
+        email = f"{first_name}.{last_name}@notaires.fr".lower()
+        if 0.05 <= kind < 0.15:
+            first_name, last_name = misspell(first_name, last_name, rng)
+        person_first_name, person_last_name = rng.choice(notaries)
+        status = "à envoyer" if rng.random() < 0.9 else "envoyé"
+        rows.append([f"{person_first_name} {person_last_name}", "", "", "", f"{rng.randint(1000, 90000)} €",
+                     f"{first_name} {last_name}", "1 place du Martroi, 45000 Orléans", "02 38 00 00 00",
+                     email, "", status, ""])
+    return rows
+
+
+def invoice_sheet_rows(count, notaries, rng):
+    """Invoice sheet: a title, the two header rows 4 and 5, then `count` client rows from row 6."""
+    rows = [["Suivi des dossiers"], [], [],
+            [primary for primary, _ in INVOICE_HEADERS], [secondary for _, secondary in INVOICE_HEADERS]]
+    for number in range(1, count + 1):
+        first_name, last_name = rng.choice(notaries)
+        ht = rng.randint(100, 5000)
+        rows.append([f"{first_name} {last_name}", f"{ht * 5} €", f"{ht * 1.2:.2f} €", f"{ht * 3.8:.2f} €",
+                     f"LD-{number:06d}", f"{ht:.2f} €", f"{ht * 0.2:.2f} €", f"{ht * 1.2:.2f} €",
+                     f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024"])
+    return rows
+
+
+@contextlib.contextmanager
+def fake_session(network, use_quotas=False):
+    """
+    Point auto_email at a fake client and account, in a scratch directory, for one run.
+
+    The waits between emails are disabled, and so are the API quota budgets unless
+    `use_quotas` is set. Yields the `FakeClient` to add the sheets to.
+    """
+    directory = tempfile.mkdtemp(prefix="auto-email-bench-")
+    cwd = os.getcwd()
+    os.chdir(directory)
+    client = FakeClient(network)
+    budgets = dict(auto_email.api.budgets)
+    try:
+        if not use_quotas:
+            auto_email.api.budgets.clear()
+        auto_email.user = FakeUser(network, client)
+        auto_email.summary = RunSummary()
+        auto_email.notary_worksheet = None
+        auto_email.filled_rows_cache.clear()
+        auto_email.EMAIL_PAUSE = 0
+        auto_email.SEND_INTERVAL = 1e-9
+        auto_email.SEND_JITTER = 0
+        auto_email.SENDER_DAILY_LIMIT = sys.maxsize
+        auto_email.start_session()
+        yield client
+    finally:
+        auto_email.send_scheduler.cancel()
+        auto_email.api.budgets.update(budgets)
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_flow(flow, size, network, renderer="pdf", use_quotas=False, seed=0):
+    """
+    Run `flow` over generated sheets of `size` rows and measure it.
+
+    Returns {'flow', 'rows', 'seconds', 'rows_per_sec', 'api_calls', 'api_calls_per_row',
+    'retries', 'errors', 'peak_memory_mb', 'calls'}; the peak memory is the one of the
+    Python allocations made by the flow, the generated sheets excluded.
+    """
+    rng = random.Random(seed)
+    notaries = generate_names(size, rng)
+    with fake_session(network, use_quotas) as client:
+        if flow in ("notary", "spool", "lookup"):
+            client.add(auto_email.NOTARY_SHEET_KEY, "Notaires", notary_sheet_rows(notaries, rng))
+        if flow in ("notary", "spool"):
+            client.add(TARGET_SHEET_KEY, "Bench target", target_sheet_rows(size, notaries, rng))
+        if flow in ("client", "facturation"):
+            client.add(auto_email.INVOICE_SHEET_KEY, "Factures", invoice_sheet_rows(size, notaries, rng))
+            auto_email.INVOICE_RENDERER = renderer
+        queries = [misspell(*rng.choice(notaries), rng) if rng.random() < 0.5 else rng.choice(notaries)
+                   for _ in range(size)] if flow == "lookup" else []
+        network.calls.clear()
+        auto_email.metrics.start()
+        tracemalloc.start()
+        started = perf_counter()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            if flow == "notary":
+                auto_email.send_notary_emails_concurrently([auto_email.open_target_sheet(TARGET_SHEET_KEY)])
+            elif flow == "spool":
+                auto_email.send_notary_emails_concurrently([auto_email.open_target_sheet(TARGET_SHEET_KEY)], spool=True)
+            elif flow == "client":
+                auto_email.create_client_drafts(list(range(6, size + 6)))
+            elif flow == "facturation":
+                auto_email.create_invoices(list(range(6, size + 6)))
+            else:
+                auto_email.load_notary_index()
+                started = perf_counter()
+                for first_name, last_name in queries:
+                    auto_email.get_row_by_name(first_name, last_name)
+                    try:
+                        auto_email.notary_index.match(first_name, last_name, auto_email.NOTARY_MATCH_THRESHOLD,
+                                                      auto_email.NOTARY_MATCH_MARGIN)
+                    except AmbiguousNotary:
+                        pass
+        seconds = perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report = auto_email.metrics.report()
+        calls = sum(network.calls.values())
+        return {
+            'flow': flow,
+            'rows': size,
+            'seconds': round(seconds, 3),
+            'rows_per_sec': round(size / seconds, 1) if seconds else None,
+            'api_calls': calls,
+            'api_calls_per_row': round(calls / size, 3),
+            'retries': sum(timing['retries'] for timing in report['endpoints'].values()),
+            'errors': len(auto_email.summary.errors),
+            'peak_memory_mb': round(peak / 2 ** 20, 1),
+            'calls': dict(network.calls),
+        }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the rows/sec change against an earlier --json output; returns the regressions."""
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = {(result['flow'], result['rows']): result for result in json.load(file)}
+    regressions = []
+    for result in results:
+        before = baseline.get((result['flow'], result['rows']))
+        if not before or not before['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+        change = result['rows_per_sec'] / before['rows_per_sec'] - 1
+        print(f"{result['flow']:<12} {result['rows']:>8}  {change:+.1%} rows/sec")
+        if change < -tolerance:
+            regressions.append(result)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Measure the notary, client and facturation flows and the notary lookups offline, "
+                    "against fake Google Sheets, Gmail and Drive services over generated sheets.")
+    parser.add_argument("--flows", nargs="+", choices=FLOWS, default=list(FLOWS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], metavar="ROWS",
+                        help="rows of the generated sheets, one run per size")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every API call takes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API calls failing with a 429")
+    parser.add_argument("--quotas", action="store_true", help="keep the API quota budgets of the app")
+    parser.add_argument("--renderer", choices=("pdf", "docx"), default="pdf",
+                        help="invoice renderer of the facturation flow, docx needs Word")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare with the --json output of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="rows/sec drop reported as a regression with --compare (default 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    print(f"{'flow':<12} {'rows':>8} {'seconds':>9} {'rows/sec':>10} {'API calls':>10} {'calls/row':>10} "
+          f"{'retries':>8} {'errors':>7} {'peak MB':>8}")
+    for size in args.sizes:
+        for flow in args.flows:
+            network = FakeNetwork(args.latency, args.jitter, args.error_rate, args.seed)
+            result = run_flow(flow, size, network, args.renderer, args.quotas, args.seed)
+            results.append(result)
+            print(f"{flow:<12} {size:>8} {result['seconds']:>9} {result['rows_per_sec']:>10} "
+                  f"{result['api_calls']:>10} {result['api_calls_per_row']:>10} {result['retries']:>8} "
+                  f"{result['errors']:>7} {result['peak_memory_mb']:>8}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        print()
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
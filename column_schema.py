@@ -0,0 +1,46 @@
+from collections import namedtuple
+
+
+class SchemaError(Exception):
+    """Raised when a sheet is missing columns a flow depends on."""
+
+
+class ColumnSchema:
+    """
+    Column lookup for a sheet with a two-row (primary / secondary) header.
+
+    The headers are scanned once and every required field is resolved to its column
+    index up front, so a renamed or deleted column is reported before any row is
+    processed and reading a field of a row is a plain list access.
+
+    Fields are given as `{field_name: (secondary_heading, primary_heading)}`, where the
+    primary heading may be None to accept the first column with that secondary heading.
+
+    Attributes:
+        columns (dict): (primary, secondary) heading pair -> column index.
+        indexes (dict): field name -> column index.
+    """
+
+    def __init__(self, primary_header_row, secondary_header_row, fields: dict):
+        self.columns = {}
+        first_secondary = {}
+        for index, (primary, secondary) in enumerate(zip(primary_header_row, secondary_header_row)):
+            self.columns.setdefault((primary, secondary), index)
+            first_secondary.setdefault(secondary, index)
+
+        self.indexes = {}
+        missing = []
+        for name, (secondary, primary) in fields.items():
+            index = first_secondary.get(secondary) if primary is None else self.columns.get((primary, secondary))
+            if index is None:
+                missing.append(secondary if primary is None else f"{primary} / {secondary}")
+            else:
+                self.indexes[name] = index
+        if missing:
+            raise SchemaError(f"Missing columns in the sheet header : {', '.join(missing)}")
+        self.Row = namedtuple('Row', fields.keys())
+
+    def row(self, row_values):
+        """Return the fields of a row as a namedtuple, empty cells read as ''."""
+        return self.Row(*(row_values[index] if index < len(row_values) else ''
+                          for index in self.indexes.values()))
@@ -0,0 +1,45 @@
+import sys
+
+try:
+    import msvcrt
+except ImportError:
+    # Not on Windows
+    msvcrt = None
+    import termios
+    import tty
+
+
+def read_choice(choices):
+    """
+    Wait for one of the keys in `choices` and return it, lowercased.
+
+    The keyboard is read blocking, on Windows as on Linux, instead of being polled. When
+    stdin is not a terminal (piped input), whole lines are read instead of single keys.
+    """
+    choices = [choice.lower() for choice in choices]
+    if not sys.stdin.isatty():
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                raise EOFError("No choice given")
+            if line.strip().lower() in choices:
+                return line.strip().lower()
+    if msvcrt is not None:
+        # Keys typed before the menu was shown don't count
+        while msvcrt.kbhit():
+            msvcrt.getwch()
+        while True:
+            key = msvcrt.getwch().lower()
+            if key in choices:
+                return key
+    fd = sys.stdin.fileno()
+    settings = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        termios.tcflush(fd, termios.TCIFLUSH)
+        while True:
+            key = sys.stdin.read(1).lower()
+            if key in choices:
+                return key
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, settings)
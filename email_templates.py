@@ -0,0 +1,135 @@
+import base64
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+from string import Formatter
+
+NOTARY_SUBJECT = 'Succession {person_last_name} - Demande de mise en relation'
+NOTARY_HTML = '''
+            <p>À l'attention de Maître {notary_last_name}</p>
+            <p>Maître, </p>
+            <p>Dans le cadre de notre activité, nous avons développé une nouvelle prestation dédiée à la recherche de bénéficiaires d'actifs non réclamés.</p>
+            <p>Votre étude s'est chargée de régler la succession de {person_full_name} dont l'acte de notoriété a été établi le {person_don}. Toutefois, il reste toujours des fonds au nom de cette personne. </p>
+            <p>Affirmatifs sur l'existence de fonds au nom de {person_full_name}, nous n'en connaissons, pour le moment, ni le support (compte bancaire, assurance vie, plan épargne retraite, épargne salariale, etc) ni le montant. </p>
+            <p>Ne pouvant nous mandater nous-mêmes, nous avons besoin de rentrer en contact avec les héritiers afin de proposer notre prestation pour obtenir les informations précitées et débloquer lesdits fonds. Ainsi, <b>pouvez-vous transmettre mes coordonnées à l'un des héritiers afin que ce dernier puisse revenir vers moi pour de plus amples renseignements ?</b></p>
+            <p>À titre informatif, sachez que :</p>
+            <ul>
+            <li>Si la succession est toujours ouverte, les fonds débloqués seront réintégrés déduits de nos honoraires</li>
+            <li>Si la succession est clôturée, les fonds seront directement reversés aux héritiers, et nous vous en aviserons si le montant de ces derniers pourrait avoir un impact sur les droits.</li>
+            </ul>
+            <p>Vous trouverez en pièce jointe une copie de la carte professionnelle de Madame Laura LASSERRE, gérante de l'étude.</p>
+            <p>Vous remerciant par avance de votre concours.</p>
+            <p>Bien cordialement,</p>
+        '''
+
+CLIENT_SUBJECT = 'Retour sur actifs débloqués - {person_full_name}'
+CLIENT_HTML = '''
+            <p>Bonjour,</p>
+            <p>Je reviens vers vous concernant les actifs au nom de {person_full_name}.</p>
+            <p>Suite au retour du notaire, je vous informe que les fonds débloqués s'élèvent à {amount_found_by_us} (voir pièce jointe).</p>
+            <p>Conformément au contrat précédemment signé, nos honoraires sont de {amount_with_tex} TTC de sorte que la somme vous revenant est de {amount_after_fee}.</p>
+            <p>Au regard des articles 11 et 12 du contrat, deux options s'offrent à vous :</p>
+            <ul>
+                <li>Récupérer ces fonds auquel cas il convient de nous faire parvenir votre RIB par mail ou par courrier. Nous procéderons à une vérification avant tout envoi des fonds</li>
+                <li>Faire don de la somme à une association de notre choix. Dans cette hypothèse, il convient impérativement  de nous donner votre accord par écrit en réponse à ce mail</li>
+            </ul>
+            <p>Nous vous informons qu'en cas de non retour de votre part sur votre choix dans un délai de deux mois à compter de la réception de ce mail, nous verserons automatiquement les fonds à une association.</p>
+            <p>Conformément au RGPD, nous vous informons que nous supprimerons à la clôture du dossier de manière sécurisée la copie de votre RIB.</p>
+            <p>Je reste à votre disposition pour répondre à d'éventuelles questions par téléphone au 07.45.25.93.99.</p>
+            <p>Vous remerciant par avance pour votre retour,</p>
+            <p>Bien cordialement,</p>
+        '''
+
+FACTURE_SUBJECT = 'Clôture dossier {person_full_name}'
+FACTURE_HTML = '''
+            <p>Bonjour,</p>
+            <p>Je reviens vers vous concernant les actifs au nom de {person_full_name}</p>
+            <p>Je vous informe que l'étude vous a transmis les fonds vous revenant déduit de nos honoraires. Pour rappel, en cas de pluralité d'héritiers, vous vous êtes engagés, en signant le contrat, à faire le partage desdits fonds entre les différents héritiers.</p>
+            <p>Notre mission étant désormais terminée, je vous remercie de votre confiance et vous invite à laisser un avis sur la page Google de LD Généalogie. En effet, comme vous l'étiez probablement lors de notre premier échange, les bénéficiaires sont souvent méfiants vis-à-vis de notre démarche. Ainsi, votre témoignage pourra les rassurer et nous permettre de débloquer et restituer d'avantage de fonds.</p>
+            <p>Vous souhaitant une bonne continuation,</p>
+            <p>Bien cordialement,</p>
+        '''
+
+
+class CompiledTemplate:
+    """
+    A `str.format` style template parsed once into literal text and field names.
+
+    Rendering only joins the literal parts with the per-recipient values, without
+    parsing the template again. `suffix` is appended as is, braces included, like a
+    signature taken from the sheets.
+    """
+
+    def __init__(self, template: str, suffix: str = ""):
+        self.parts = []
+        for literal, field, _, _ in Formatter().parse(template):
+            if literal:
+                self.parts.append((True, literal))
+            if field is not None:
+                self.parts.append((False, field))
+        if suffix:
+            self.parts.append((True, suffix))
+
+    def render(self, **fields):
+        return "".join(text if literal else str(fields[text]) for literal, text in self.parts)
+
+
+@lru_cache(maxsize=None)
+def load_attachment(path: str, filename: str):
+    """Read and base64-encode a PDF attachment once per process."""
+    with open(path, 'rb') as pdf_file:
+        pdf_attachment = MIMEApplication(pdf_file.read(), _subtype='pdf')
+    pdf_attachment.add_header(
+        'Content-Disposition', f'attachment; filename={filename}')
+    return pdf_attachment
+
+
+class MessageFactory:
+    """
+    Builds the Gmail API bodies of the notary, client and facture emails.
+
+    The templates are compiled with the sender's signature appended once, and the
+    notary attachment is loaded and encoded on first use, so building a message only
+    fills in the recipient fields and serializes it.
+
+    Attributes:
+        signature (str): HTML signature appended to every message.
+        attachment_path (str): Path of the PDF attached to notary emails.
+    """
+    ATTACHMENT_FILENAME = 'Carte_pro_Laura_LASSERRE.pdf'
+
+    def __init__(self, signature: str, attachment_path: str):
+        self.signature = signature
+        self.attachment_path = attachment_path
+        self.notary_subject = CompiledTemplate(NOTARY_SUBJECT)
+        self.notary_html = CompiledTemplate(NOTARY_HTML, signature)
+        self.client_subject = CompiledTemplate(CLIENT_SUBJECT)
+        self.client_html = CompiledTemplate(CLIENT_HTML, signature)
+        self.facture_subject = CompiledTemplate(FACTURE_SUBJECT)
+        self.facture_html = CompiledTemplate(FACTURE_HTML, signature)
+
+    def _build(self, sender, to, subject, html, attachment=None):
+        message = MIMEMultipart()
+        message['From'] = sender
+        message['To'] = to
+        message['Subject'] = subject
+        message.attach(MIMEText(html, 'html'))
+        if attachment is not None:
+            message.attach(attachment)
+        return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')}
+
+    def notary(self, sender: str, to: str, person_full_name: str, person_last_name: str, notary_last_name: str, person_don: str):
+        fields = dict(person_full_name=person_full_name, person_last_name=person_last_name,
+                      notary_last_name=notary_last_name, person_don=person_don)
+        return self._build(sender, to, self.notary_subject.render(**fields), self.notary_html.render(**fields),
+                           load_attachment(self.attachment_path, self.ATTACHMENT_FILENAME))
+
+    def client(self, sender: str, to: str, person_full_name: str, amount_found_by_us: str, amount_with_tex: str, amount_after_fee: str):
+        fields = dict(person_full_name=person_full_name, amount_found_by_us=amount_found_by_us,
+                      amount_with_tex=amount_with_tex, amount_after_fee=amount_after_fee)
+        return self._build(sender, to, self.client_subject.render(**fields), self.client_html.render(**fields))
+
+    def facture(self, sender: str, to: str, person_full_name: str):
+        fields = dict(person_full_name=person_full_name)
+        return self._build(sender, to, self.facture_subject.render(**fields), self.facture_html.render(**fields))
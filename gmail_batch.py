@@ -0,0 +1,89 @@
+from googleapiclient.http import BatchHttpRequest
+
+from api_retry import GMAIL_COSTS, classify_error
+
+
+class DraftBatch:
+    """
+    Groups Gmail drafts.create calls into batch HTTP requests.
+
+    Messages are queued with a key (usually the sheet row they come from) and sent
+    `batch_size` at a time. Once a batch has run, `callback(key, status, error)` is
+    called for every message: `status` is the created draft, or None with `error` set
+    when that message failed.
+
+    Gmail accepts up to 100 calls per batch but throttles batches above 50, so
+    `batch_size` defaults to 50.
+
+    Attributes:
+        gmail_service (Resource): Authenticated service for Gmail API.
+        user_id (str): Gmail user the drafts are created for.
+        batch_uri (str): Batch endpoint, defaults to the one of `gmail_service`.
+        http (httplib2.Http): Transport used to send the batches, defaults to the
+            one of `gmail_service`.
+        executor (ApiExecutor): Optional retry wrapper; when set, whole batches and the
+            drafts that failed with a retryable error are sent again.
+    """
+    MAX_BATCH_SIZE = 100
+
+    def __init__(self, gmail_service, user_id, callback, batch_size=50, batch_uri=None, http=None, executor=None):
+        self.gmail_service = gmail_service
+        self.user_id = user_id
+        self.callback = callback
+        self.batch_size = min(batch_size, self.MAX_BATCH_SIZE)
+        self.batch_uri = batch_uri
+        self.http = http
+        self.executor = executor
+        self._queue = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, message, key):
+        """Queue a message from `create_*_message`; sends the batch once it is full."""
+        self._queue.append((key, message))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send every queued draft and report each result through the callback."""
+        while self._queue:
+            chunk, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+            self._execute(chunk)
+
+    def _execute(self, chunk, attempt=0):
+        results = {}
+
+        def on_response(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        if self.batch_uri:
+            batch = BatchHttpRequest(callback=on_response, batch_uri=self.batch_uri)
+        else:
+            batch = self.gmail_service.new_batch_http_request(callback=on_response)
+        for position, (_, message) in enumerate(chunk):
+            batch.add(self.gmail_service.users().drafts().create(
+                userId=self.user_id, body={'message': message}), request_id=str(position))
+        try:
+            if self.executor is not None:
+                self.executor.execute('gmail', lambda: batch.execute(http=self.http),
+                                      cost=GMAIL_COSTS['drafts.create'] * len(chunk),
+                                      endpoint='gmail.batch.drafts.create')
+            else:
+                batch.execute(http=self.http)
+        except Exception as e:
+            # The whole batch failed, none of its drafts were created
+            for key, _ in chunk:
+                self.callback(key, None, e)
+            return
+        retry = []
+        for position, (key, message) in enumerate(chunk):
+            response, exception = results.get(str(position), (None, None))
+            if (exception is not None and self.executor is not None
+                    and attempt < self.executor.max_retries and classify_error(exception)[0]):
+                retry.append((key, message))
+                continue
+            self.callback(key, response if exception is None else None, exception)
+        if retry:
+            self.executor.sleep(self.executor.backoff(attempt))
+            self._execute(retry, attempt + 1)
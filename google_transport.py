@@ -0,0 +1,85 @@
+import threading
+
+import gspread
+import httplib2
+from google.auth.transport.requests import AuthorizedSession
+from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
+
+
+class SharedSession(AuthorizedSession):
+    """
+    `AuthorizedSession` of one account, sending its requests through a shared connection pool.
+
+    The session is safe to use from several threads at once. An expired token is
+    refreshed once, by the first thread to notice it, while the others wait for it
+    instead of each refreshing their own copy.
+
+    Attributes:
+        credentials (Credentials): Credentials of the account.
+        timeout (float): Seconds to wait for a response when the caller gives no timeout.
+    """
+
+    def __init__(self, credentials, adapter, timeout=120, on_response=None):
+        super().__init__(credentials)
+        self.mount("https://", adapter)
+        self.timeout = timeout
+        self._refresh_lock = threading.Lock()
+        if on_response is not None:
+            self.hooks['response'].append(on_response)
+
+    def refresh(self):
+        with self._refresh_lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(self._auth_request)
+
+    def request(self, method, url, data=None, headers=None, timeout=None, **kwargs):
+        if not self.credentials.valid:
+            self.refresh()
+        return super().request(method, url, data=data, headers=headers,
+                               timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+
+class SessionHttp:
+    """
+    `httplib2.Http` look-alike sending the requests of a googleapiclient client through a `SharedSession`.
+
+    Unlike httplib2, it can be shared between threads, so one client per API is enough.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        response = self.session.request(method, uri, data=body, headers=headers)
+        return httplib2.Response({'status': response.status_code, **response.headers}), response.content
+
+
+class GoogleTransport:
+    """
+    The one HTTP transport of every Google client of the app: gspread, Gmail, Drive and Sheets.
+
+    All sessions, one per account, share a single keep-alive connection pool, so the TLS
+    connections to the Google APIs are opened once and reused by every client and thread.
+
+    Attributes:
+        adapter (HTTPAdapter): Connection pool of the sessions.
+        timeout (float): Seconds to wait for a response.
+        on_response (callable): Optional `requests` response hook added to every session.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, timeout=120, on_response=None):
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.timeout = timeout
+        self.on_response = on_response
+
+    def session(self, credentials):
+        """New `SharedSession` of `credentials`; keep it for as long as the credentials are used."""
+        return SharedSession(credentials, self.adapter, self.timeout, self.on_response)
+
+    def build(self, session, name, version):
+        """googleapiclient client of the `name` API, sending its requests through `session`."""
+        return build(name, version, http=SessionHttp(session), static_discovery=True, cache_discovery=False)
+
+    def gspread_client(self, session):
+        return gspread.Client(auth=session.credentials, session=session)
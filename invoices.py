@@ -0,0 +1,192 @@
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from docx import Document
+
+from pdf_invoice import render_invoice, template_logo
+
+INVOICE_DIR = "Invoice"
+
+
+class TemplateError(Exception):
+    pass
+
+
+class InvoiceTemplate:
+    """
+    The invoice template, parsed once and filled in place for every invoice.
+
+    When loaded, the template is scanned once for its placeholders, including the ones
+    Word split over several runs of a paragraph. Each run holding (part of) a placeholder
+    is stored with its text cut into literal pieces and placeholders, so filling an
+    invoice only rewrites those runs. `render` then puts their text back, ready for the
+    next invoice.
+
+    A template missing one of `PLACEHOLDERS`, or holding an unknown one, is rejected
+    with a `TemplateError`.
+
+    Attributes:
+        path (str): Location of template.docx.
+        fields (list): (run, pieces) of the runs to fill, `pieces` being
+            (is placeholder, text) tuples.
+    """
+    PLACEHOLDERS = ("(DATE)", "(B)", "(Q)", "(R)", "(S)", "(T)", "(W)")
+    # Anything looking like a placeholder, to catch the misspelled ones
+    PLACEHOLDER_PATTERN = re.compile(r"\([A-Z]{1,5}\)")
+
+    def __init__(self, path):
+        self.path = path
+        self.document = Document(path)
+        self.fields = []
+        found = set()
+        for paragraph in self.paragraphs():
+            found.update(self._compile(paragraph))
+        missing = [placeholder for placeholder in self.PLACEHOLDERS if placeholder not in found]
+        if missing:
+            raise TemplateError(f"Placeholders {', '.join(missing)} not found in {path}")
+
+    def paragraphs(self):
+        """Every paragraph of the header, the body and the tables, once each."""
+        seen = set()
+        paragraphs = list(self.document.sections[0].header.paragraphs) + list(self.document.paragraphs)
+        for table in self.document.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    paragraphs.extend(cell.paragraphs)
+        for paragraph in paragraphs:
+            # Merged table cells come back once per grid cell
+            if paragraph._p not in seen:
+                seen.add(paragraph._p)
+                yield paragraph
+
+    def _compile(self, paragraph):
+        runs = paragraph.runs
+        texts = [run.text for run in runs]
+        full_text = "".join(texts)
+        matches = [(match.start(), match.end(), match.group())
+                   for match in self.PLACEHOLDER_PATTERN.finditer(full_text)]
+        for _, _, placeholder in matches:
+            if placeholder not in self.PLACEHOLDERS:
+                raise TemplateError(f"Unknown placeholder {placeholder} in {self.path}: {full_text!r}")
+        start = 0
+        for run, text in zip(runs, texts):
+            end = start + len(text)
+            pieces, position, touched = [], start, False
+            for match_start, match_end, placeholder in matches:
+                if match_end <= start or match_start >= end:
+                    continue
+                touched = True
+                if match_start >= start:
+                    pieces.append((False, full_text[position:match_start]))
+                    pieces.append((True, placeholder))
+                position = max(position, match_end)
+            if touched:
+                if position < end:
+                    pieces.append((False, full_text[position:end]))
+                self.fields.append((run, [(is_placeholder, piece) for is_placeholder, piece in pieces
+                                          if is_placeholder or piece]))
+            start = end
+        return {placeholder for _, _, placeholder in matches}
+
+    def render(self, replacements, output_path):
+        """Save the template with `replacements` ({placeholder: text}) applied to `output_path`."""
+        originals = [run.text for run, _ in self.fields]
+        try:
+            for run, pieces in self.fields:
+                run.text = "".join(replacements[piece] if is_placeholder else piece
+                                   for is_placeholder, piece in pieces)
+            self.document.save(output_path)
+        finally:
+            for (run, _), text in zip(self.fields, originals):
+                run.text = text
+
+
+def invoice_name(facture_number, name):
+    return f"{facture_number} {name}"
+
+
+def invoice_replacements(date, name, facture_number, ht, tva, tcc, paid_date):
+    return {
+        "(DATE)": date,
+        "(B)": name,
+        "(Q)": facture_number,
+        "(R)": ht,
+        "(S)": tva,
+        "(T)": tcc,
+        "(W)": paid_date,
+    }
+
+
+_template = None
+
+
+def load_template(path):
+    """The template of this process, parsed on first use; raises TemplateError."""
+    global _template
+    if _template is None or _template.path != path:
+        _template = InvoiceTemplate(path)
+    return _template
+
+
+def _render_docx(directory, invoice):
+    date, name, facture_number, ht, tva, tcc, paid_date = invoice
+    path = os.path.join(directory, invoice_name(facture_number, name) + ".docx")
+    _template.render(invoice_replacements(*invoice), path)
+    return path
+
+
+def generate_invoices(template_path, invoices, convert, workers=4):
+    """
+    Create the DOCX and PDF files of `invoices` in the Invoice directory.
+
+    `invoices` are (date, name, facture number, HT, TVA, TTC, paid date) tuples, the date
+    being formatted by the caller as the workers don't share its locale. The DOCX files
+    are filled in a pool of `workers` processes, each parsing the template once, then
+    converted to PDF by a single `convert(input_dir, output_dir)` call (`docx2pdf.convert`)
+    over the batch. Returns the paths of the DOCX files.
+    """
+    if not invoices:
+        return []
+    os.makedirs(INVOICE_DIR, exist_ok=True)
+    # The DOCX files of the batch wait for their conversion in a directory of their own
+    pending_dir = tempfile.mkdtemp(prefix="pending-", dir=INVOICE_DIR)
+    try:
+        workers = min(workers, len(invoices))
+        if workers <= 1:
+            load_template(template_path)
+            pending = [_render_docx(pending_dir, invoice) for invoice in invoices]
+        else:
+            with ProcessPoolExecutor(workers, initializer=load_template, initargs=(template_path,)) as pool:
+                pending = list(pool.map(_render_docx, [pending_dir] * len(invoices), invoices))
+        paths = [os.path.join(INVOICE_DIR, os.path.basename(path)) for path in pending]
+        try:
+            convert(pending_dir, INVOICE_DIR)
+        finally:
+            # The DOCX files are kept even when the conversion failed
+            for path, destination in zip(pending, paths):
+                os.replace(path, destination)
+        return paths
+    finally:
+        shutil.rmtree(pending_dir, ignore_errors=True)
+
+
+def generate_pdf_invoices(template_path, invoices):
+    """
+    Write the PDF files of `invoices` in the Invoice directory, without Word.
+
+    Same `invoices` as `generate_invoices`. The PDFs are drawn directly by `pdf_invoice`,
+    with the logo of the template, so no DOCX file is created. Returns the PDF paths.
+    """
+    if not invoices:
+        return []
+    os.makedirs(INVOICE_DIR, exist_ok=True)
+    logo = template_logo(template_path)
+    paths = []
+    for date, name, facture_number, ht, tva, tcc, paid_date in invoices:
+        path = os.path.join(INVOICE_DIR, invoice_name(facture_number, name) + ".pdf")
+        render_invoice(path, logo, date, name, facture_number, ht, tva, tcc, paid_date)
+        paths.append(path)
+    return paths
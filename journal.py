@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class JobJournal:
+    """
+    Append-only JSONL journal of the notary rows handled by `send_notary_emails`.
+
+    Every stage of a row is appended as one line and synced to disk before the run moves on:
+
+        prepared  the message is built and waiting for its send slot
+        sent      Gmail accepted the email (`message_id` is the Gmail message id)
+        drafted   the draft was created instead (`message_id` is the draft id)
+        unconfirmed  Gmail failed without telling whether the email went out; the row
+                  is left to be checked by hand rather than sent again
+        updated   every sheet cell of the row has been written back
+
+    `sent` and `drafted` entries carry the exact cell updates of the row, so a run that
+    stopped between Gmail and the sheet can write them back without sending again.
+    Rows that reached `updated` are dropped when the journal is opened, the sheet being
+    the reference for them from then on.
+
+    Attributes:
+        path (str): Location of the JSONL file.
+    """
+    DONE_STAGES = ('sent', 'drafted', 'unconfirmed')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._waiting = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line of a run killed while writing it
+                        continue
+                    self._rows[(entry['spreadsheet'], entry['row'])] = entry
+        self._compact()
+
+    def _compact(self):
+        self._rows = {key: entry for key, entry in self._rows.items() if entry['stage'] != 'updated'}
+        # Rewritten aside then swapped in, so a crash leaves either journal whole
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for entry in self._rows.values():
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+    def record(self, spreadsheet_id, row, stage, message_id=None, updates=None):
+        """
+        Append a stage of a row.
+
+        `updates` are the cells to write back, as [spreadsheet id, worksheet id, row, col, value].
+        """
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'spreadsheet': spreadsheet_id,
+            'row': row,
+            'stage': stage,
+        }
+        if message_id is not None:
+            entry['message_id'] = message_id
+        if updates is not None:
+            entry['updates'] = updates
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            self._rows[(spreadsheet_id, row)] = entry
+            if updates:
+                self._waiting[(spreadsheet_id, row)] = {tuple(update[:4]) for update in updates}
+
+    def stage(self, spreadsheet_id, row):
+        entry = self._rows.get((spreadsheet_id, row))
+        return entry['stage'] if entry else None
+
+    def is_done(self, spreadsheet_id, row):
+        """True when Gmail already handled the row, whatever the sheet says."""
+        return self.stage(spreadsheet_id, row) in self.DONE_STAGES
+
+    def pending_write_backs(self, spreadsheet_id):
+        """Entries of rows sent or drafted but not written back to the sheet yet."""
+        return [entry for (spreadsheet, _), entry in self._rows.items()
+                if spreadsheet == spreadsheet_id and entry['stage'] in self.DONE_STAGES]
+
+    def cells_written(self, worksheet, cells):
+        """`SheetWriteBuffer.on_flush` hook: marks rows `updated` once all their cells are written."""
+        written = {(worksheet.spreadsheet.id, worksheet.id, row, col) for row, col in cells}
+        with self._lock:
+            finished = []
+            for key, waiting in self._waiting.items():
+                waiting -= written
+                if not waiting:
+                    finished.append(key)
+            for key in finished:
+                del self._waiting[key]
+        for spreadsheet_id, row in finished:
+            self.record(spreadsheet_id, row, 'updated')
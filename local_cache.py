@@ -0,0 +1,61 @@
+import json
+import os
+import threading
+from time import time
+
+
+class DiskCache:
+    """
+    Small JSON file cache of values tagged with the revision of their source.
+
+    An entry younger than `ttl` seconds is returned without any check. An older one is
+    revalidated against the current revision of its source (e.g. the Drive `version` of
+    a sheet), which is much cheaper than fetching the source again, and is only fetched
+    again when that revision changed.
+
+    Attributes:
+        path (str): Location of the JSON file.
+        ttl (float): Seconds an entry is trusted without revalidation.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                self._data = json.load(file)
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._data, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def get(self, key, fetch, revision):
+        """
+        Cached value of `key`, calling `fetch()` when it is missing or out of date.
+
+        `revision` is either the current revision of the source, always compared, or a
+        callable returning it, only called once the entry is older than the TTL.
+        """
+        if callable(revision):
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and time() - entry['fetched'] < self.ttl:
+                    return entry['value']
+            revision = revision()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry['revision'] == revision:
+                entry['fetched'] = time()
+                self._save()
+                return entry['value']
+        value = fetch()
+        with self._lock:
+            self._data[key] = {'value': value, 'revision': revision, 'fetched': time()}
+            self._save()
+        return value
@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf'))
+
+
+class Timing:
+    """
+    Calls of one endpoint, or runs of one stage.
+
+    Attributes:
+        count (int): Number of calls.
+        seconds (float): Total time spent, in seconds.
+        max_seconds (float): Longest call, in seconds.
+        histogram (list): Calls per bucket of `LATENCY_BUCKETS`.
+        errors (Counter): Exception class name -> number of failed calls.
+        retries (int): Calls sent again after a retryable error.
+        bytes (int): Bytes sent and received, where known.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+        self.errors = Counter()
+        self.retries = 0
+        self.bytes = 0
+
+    def add(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        milliseconds = seconds * 1000
+        for bucket, bound in enumerate(LATENCY_BUCKETS):
+            if milliseconds <= bound:
+                self.histogram[bucket] += 1
+                break
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the `fraction` percentile, in milliseconds."""
+        rank = fraction * self.count
+        seen = 0
+        for bound, calls in zip(LATENCY_BUCKETS, self.histogram):
+            seen += calls
+            if calls and seen >= rank:
+                return min(bound, self.max_seconds * 1000)
+        return 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'seconds': round(self.seconds, 3),
+            'mean_ms': round(self.seconds * 1000 / self.count, 1) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 1),
+            'p95_ms': round(self.percentile(0.95), 1),
+            'max_ms': round(self.max_seconds * 1000, 1),
+            'histogram': dict(zip(map(str, LATENCY_BUCKETS), self.histogram)),
+            'errors': dict(self.errors),
+            'retries': self.retries,
+            'bytes': self.bytes,
+        }
+
+
+class Metrics:
+    """
+    Latency, quota and error counters of a task, reported as JSON and CSV at its end.
+
+    `ApiExecutor` records every Google API call under its endpoint name
+    ("gmail.users.messages.send", "sheets.batch_get"...), and the time it waited for the
+    quota budget of its API. The pipeline marks its stages (countdowns, sheet reads, PDF
+    conversion...) with `stage`, and counts the rows it handles with `add_rows`.
+
+    Thread-safe, as calls are made from the sheet and scheduler threads.
+
+    Attributes:
+        endpoints (dict): Endpoint name -> Timing of its calls.
+        stages (dict): Stage name -> Timing of its runs.
+        quota_waits (dict): API name -> Timing of the waits for its budget.
+        rows (int): Rows handled by the task.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = threading.local()
+        self.start()
+
+    def start(self):
+        """Forget the counters of the previous task."""
+        with self._lock:
+            self.endpoints = {}
+            self.stages = {}
+            self.quota_waits = {}
+            self.rows = 0
+            self.started = perf_counter()
+
+    def _timing(self, timings, name):
+        if name not in timings:
+            timings[name] = Timing()
+        return timings[name]
+
+    def record(self, endpoint, seconds, error=None, request_bytes=0):
+        with self._lock:
+            timing = self._timing(self.endpoints, endpoint)
+            timing.add(seconds)
+            timing.bytes += request_bytes
+            if error is not None:
+                timing.errors[type(error).__name__] += 1
+
+    def record_retry(self, endpoint):
+        with self._lock:
+            self._timing(self.endpoints, endpoint).retries += 1
+
+    def record_quota_wait(self, api, seconds):
+        with self._lock:
+            self._timing(self.quota_waits, api).add(seconds)
+
+    @contextmanager
+    def call(self, endpoint):
+        """Mark `endpoint` as the call of this thread, so `add_bytes` can attribute responses to it."""
+        self._current.endpoint = endpoint
+        try:
+            yield
+        finally:
+            self._current.endpoint = None
+
+    def add_bytes(self, count):
+        """Count `count` bytes for the call running in this thread, if any."""
+        endpoint = getattr(self._current, 'endpoint', None)
+        if endpoint is not None:
+            with self._lock:
+                self._timing(self.endpoints, endpoint).bytes += count
+
+    @contextmanager
+    def stage(self, name):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started
+            with self._lock:
+                self._timing(self.stages, name).add(elapsed)
+
+    def add_rows(self, count=1):
+        with self._lock:
+            self.rows += count
+
+    def report(self):
+        """Summary of the task: rows/hour, API calls per row and the slowest stage, with every counter."""
+        with self._lock:
+            duration = perf_counter() - self.started
+            calls = sum(timing.count for timing in self.endpoints.values())
+            slowest = max(self.stages, key=lambda name: self.stages[name].seconds, default=None)
+            return {
+                'duration': round(duration, 1),
+                'rows': self.rows,
+                'rows_per_hour': round(self.rows * 3600 / duration, 1) if duration else 0.0,
+                'api_calls': calls,
+                'api_calls_per_row': round(calls / self.rows, 2) if self.rows else None,
+                'slowest_stage': slowest,
+                'endpoints': {name: timing.as_dict() for name, timing in sorted(self.endpoints.items())},
+                'stages': {name: timing.as_dict() for name, timing in sorted(self.stages.items())},
+                'quota_waits': {name: timing.as_dict() for name, timing in sorted(self.quota_waits.items())},
+            }
+
+    def write(self, path, task=None):
+        """Write the report to `path` as JSON, and to the same path with a .csv extension as one line per counter."""
+        report = self.report()
+        report = {'task': task, **report} if task is not None else report
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        csv_path = os.path.splitext(path)[0] + ".csv"
+        with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['kind', 'name', 'count', 'seconds', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms',
+                             'errors', 'retries', 'bytes'])
+            for kind in ('endpoints', 'stages', 'quota_waits'):
+                for name, timing in report[kind].items():
+                    writer.writerow([kind, name, timing['count'], timing['seconds'], timing['mean_ms'],
+                                     timing['p50_ms'], timing['p95_ms'], timing['max_ms'],
+                                     ";".join(f"{error}={count}" for error, count in timing['errors'].items()),
+                                     timing['retries'], timing['bytes']])
+        return report
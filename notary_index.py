@@ -0,0 +1,284 @@
+import re
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+
+from unidecode import unidecode
+
+NAME_PATTERN = r'[ ,\-\n]'
+
+
+def normalize_name(name: str):
+    """Strip spaces, commas, dashes and accents so names compare the way the sheet is filled."""
+    return unidecode(re.sub(NAME_PATTERN, '', name)).lower()
+
+
+def name_words(name: str):
+    """Normalized words of a name, sorted, so "DE LA FONTAINE" and "FONTAINE DE LA" compare equal."""
+    words = [normalize_name(word) for word in re.split(NAME_PATTERN, name)]
+    return tuple(sorted(word for word in words if word))
+
+
+def fuzzy_key(name: str):
+    return "".join(name_words(name))
+
+
+def first_name_similarity(a, b, word_threshold=0.85):
+    """
+    Similarity of two first names given as `name_words`, from 0 to 1, compared word by word.
+
+    A word only counts when it is the same name give or take a typo: "Jean" is not
+    Jeanne, nor "Marc" Marcel. Words missing from one of the names lower the score,
+    unless the shorter name has at least two words, all found in the other: "Jean-Pierre"
+    is still Jean Pierre Marie, while "Marie" alone may as well be Marie-Claire.
+    """
+    if "".join(a) == "".join(b):
+        return 1.0
+    if not a or not b:
+        return 0.0
+    shorter, longer = sorted((a, b), key=len)
+    total = 0.0
+    for word in shorter:
+        score = max(similarity(word, other) for other in longer)
+        if score >= word_threshold:
+            total += score
+    if len(shorter) >= 2 and set(shorter) <= set(longer):
+        return 0.9
+    return total / len(longer)
+
+
+def trigrams(key: str):
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str):
+    """Similarity of two normalized names, from 0 to 1."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def email_words(value: str):
+    """Lowercased addresses of a cell, which may hold several separated by spaces, commas or new lines."""
+    return {word for word in re.split(r'[\s,;]+', str(value).lower()) if word}
+
+
+class AmbiguousNotary(Exception):
+    """Several notaries of the directory match a name about as well as each other."""
+    label = "Ambiguous notary"
+
+    def __init__(self, first_name, last_name, rows):
+        super().__init__(f"{first_name} {last_name} matches notary rows {', '.join(map(str, rows))}")
+        self.rows = rows
+
+
+class UnconfirmedNotary(AmbiguousNotary):
+    """Notaries of the directory are named almost like this one, but none has its email."""
+    label = "Unconfirmed notary"
+
+    def __init__(self, first_name, last_name, rows):
+        super().__init__(first_name, last_name, rows)
+        self.args = (f"{first_name} {last_name} is named like notary rows {', '.join(map(str, rows))}, "
+                     f"without their email",)
+
+
+class NotaryIndex:
+    """
+    In-memory copy of the notary directory sheet, indexed by normalized name.
+
+    It is built from one `get_all_values()` of the sheet; lookups are then answered from a
+    dict keyed by the normalized (first name, last name) pair. Rows inserted or cells
+    updated through this class are mirrored locally so the row numbers stay in sync
+    with the sheet.
+
+    Names written a bit differently ("Jean-Pierre" / "Jean Pierre Marie", a typo, a moved
+    particle) are found by `match`. The rows are blocked by last name, with the words
+    sorted, and a trigram index of the last names gives the blocks worth comparing, so
+    a lookup only scores a handful of rows however large the directory is.
+
+    All methods are thread-safe; hold `lock` to chain a lookup and an update atomically.
+
+    Attributes:
+        rows (list): The notary sheet rows, `rows[0]` being sheet row 1.
+        lock (RLock): Lock guarding `rows` and the name indexes.
+    """
+    FIRST_NAME_COL = 2
+    LAST_NAME_COL = 3
+    # Columns I and J, where the emails of a notary are kept
+    EMAIL_COLS = (9, 10)
+    # Last names sharing fewer trigrams than this (Dice coefficient) are not compared at all
+    TRIGRAM_THRESHOLD = 0.4
+    # Nor are the ones less similar than this
+    LAST_NAME_THRESHOLD = 0.75
+    # Weight of the last name in the score of a match, the first name making up the rest
+    LAST_NAME_WEIGHT = 0.6
+
+    def __init__(self, rows):
+        self.lock = threading.RLock()
+        self.reload(rows)
+
+    def reload(self, rows):
+        """Index `rows` from scratch, e.g. when the sheet may have changed behind the index."""
+        with self.lock:
+            self._load(rows)
+
+    def _load(self, rows):
+        self.rows = [list(row) for row in rows]
+        self._index = {}
+        # Last name key -> {row number: first name words}
+        self._blocks = {}
+        # Last name key -> number of its trigrams
+        self._trigram_counts = {}
+        # Trigram -> last name keys holding it
+        self._trigrams = {}
+        for row_number, row in enumerate(self.rows, start=1):
+            self._index.setdefault(self._row_key(row), row_number)
+            self._add_to_blocks(row_number, row)
+
+    def _fuzzy_row_key(self, row):
+        first_name = row[self.FIRST_NAME_COL - 1] if len(row) >= self.FIRST_NAME_COL else ""
+        last_name = row[self.LAST_NAME_COL - 1] if len(row) >= self.LAST_NAME_COL else ""
+        return name_words(first_name), fuzzy_key(last_name)
+
+    def _add_to_blocks(self, row_number, row):
+        first_words, last_key = self._fuzzy_row_key(row)
+        if not last_key:
+            return
+        if last_key not in self._blocks:
+            self._blocks[last_key] = {}
+            self._trigram_counts[last_key] = len(trigrams(last_key))
+            for trigram in trigrams(last_key):
+                self._trigrams.setdefault(trigram, set()).add(last_key)
+        self._blocks[last_key][row_number] = first_words
+
+    def _remove_from_blocks(self, row_number, row):
+        first_words, last_key = self._fuzzy_row_key(row)
+        block = self._blocks.get(last_key)
+        if block is None or block.pop(row_number, None) is None or block:
+            return
+        del self._blocks[last_key]
+        del self._trigram_counts[last_key]
+        for trigram in trigrams(last_key):
+            self._trigrams[trigram].discard(last_key)
+
+    def _row_key(self, row):
+        first_name = row[self.FIRST_NAME_COL - 1] if len(row) >= self.FIRST_NAME_COL else ""
+        last_name = row[self.LAST_NAME_COL - 1] if len(row) >= self.LAST_NAME_COL else ""
+        return normalize_name(first_name), normalize_name(last_name)
+
+    def find(self, first_name: str, last_name: str):
+        """Return (row number, row values) of the first matching notary, or (None, None)."""
+        with self.lock:
+            row_number = self._index.get((normalize_name(first_name), normalize_name(last_name)))
+            if row_number is None:
+                return None, None
+            return row_number, list(self.rows[row_number - 1])
+
+    def candidates(self, first_name: str, last_name: str):
+        """Return (score, row number) of the notaries whose name looks like this one, best first."""
+        first_words, last_key = name_words(first_name), fuzzy_key(last_name)
+        if not last_key:
+            return []
+        query = trigrams(last_key)
+        with self.lock:
+            # Last names sharing trigrams with this one
+            shared = Counter(key for trigram in query for key in self._trigrams.get(trigram, ()))
+            scored = []
+            for key, count in shared.items():
+                if 2 * count / (len(query) + self._trigram_counts[key]) < self.TRIGRAM_THRESHOLD:
+                    continue
+                last_score = similarity(last_key, key)
+                if last_score < self.LAST_NAME_THRESHOLD:
+                    continue
+                # Rows repeating a name count once, as the first of them
+                first_rows = {}
+                for row_number, row_first_words in self._blocks[key].items():
+                    first_rows[row_first_words] = min(row_number, first_rows.get(row_first_words, row_number))
+                for row_first_words, row_number in first_rows.items():
+                    first_score = first_name_similarity(first_words, row_first_words)
+                    score = self.LAST_NAME_WEIGHT * last_score + (1 - self.LAST_NAME_WEIGHT) * first_score
+                    scored.append((score, row_number))
+        scored.sort(key=lambda candidate: (-candidate[0], candidate[1]))
+        return scored
+
+    def has_email(self, row_number: int, email: str):
+        """True when `email` is one of the addresses of columns I and J of the row."""
+        row = self.rows[row_number - 1]
+        emails = set()
+        for col in self.EMAIL_COLS:
+            if len(row) >= col:
+                emails |= email_words(row[col - 1])
+        return bool(email) and email.strip().lower() in emails
+
+    def match(self, first_name: str, last_name: str, threshold=0.85, margin=0.05, email=None):
+        """
+        Return (row number, row values) of the notary named like this, or (None, None).
+
+        An exact match of the names wins. A notary named a bit differently (a typo, a moved
+        particle...) and scoring at least `threshold` may as well be another notary, so it
+        is only taken when its row also holds `email`, and no other such notary scores
+        within `margin` of it. Raises `AmbiguousNotary` when several do, and
+        `UnconfirmedNotary` when the notaries named like this don't have `email`.
+        """
+        with self.lock:
+            row_number, row = self.find(first_name, last_name)
+            if row_number is not None:
+                return row_number, row
+            candidates = [(score, row_number) for score, row_number in self.candidates(first_name, last_name)
+                          if score >= threshold]
+            if not candidates:
+                return None, None
+            confirmed = [(score, row_number) for score, row_number in candidates if self.has_email(row_number, email)]
+            if not confirmed:
+                raise UnconfirmedNotary(first_name, last_name, [row_number for _, row_number in candidates])
+            candidates = confirmed
+            best_score, best_row = candidates[0]
+            close = [row_number for score, row_number in candidates if best_score - score <= margin]
+            if len(close) > 1:
+                raise AmbiguousNotary(first_name, last_name, close)
+            return best_row, list(self.rows[best_row - 1])
+
+    def next_row(self, col=FIRST_NAME_COL):
+        """Row number right after the last non-empty cell of `col`, like `len(col_values(col)) + 1`."""
+        with self.lock:
+            for row_number in range(len(self.rows), 0, -1):
+                row = self.rows[row_number - 1]
+                if len(row) >= col and row[col - 1] != "":
+                    return row_number + 1
+            return 1
+
+    def insert_row(self, values, row_number: int):
+        """Mirror `Worksheet.insert_row(values, index=row_number)`: rows below move down by one."""
+        with self.lock:
+            self.rows.insert(row_number - 1, list(values))
+            for key, indexed_row in self._index.items():
+                if indexed_row >= row_number:
+                    self._index[key] = indexed_row + 1
+            for key, block in self._blocks.items():
+                if any(indexed_row >= row_number for indexed_row in block):
+                    self._blocks[key] = {indexed_row + 1 if indexed_row >= row_number else indexed_row: first_words
+                                         for indexed_row, first_words in block.items()}
+            self._add_to_blocks(row_number, values)
+            key = self._row_key(values)
+            if key not in self._index or self._index[key] > row_number:
+                self._index[key] = row_number
+
+    def update_cell(self, row_number: int, col: int, value):
+        """Mirror `Worksheet.update_cell(row_number, col, value)`."""
+        with self.lock:
+            while len(self.rows) < row_number:
+                self.rows.append([])
+            row = self.rows[row_number - 1]
+            row.extend([""] * (col - len(row)))
+            old_key = self._row_key(row)
+            if col in (self.FIRST_NAME_COL, self.LAST_NAME_COL):
+                self._remove_from_blocks(row_number, row)
+            row[col - 1] = value
+            if col in (self.FIRST_NAME_COL, self.LAST_NAME_COL):
+                if self._index.get(old_key) == row_number:
+                    del self._index[old_key]
+                self._index.setdefault(self._row_key(row), row_number)
+                self._add_to_blocks(row_number, row)
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+from time import time
+
+OutboxEntry = namedtuple('OutboxEntry', 'id sender spreadsheet_id row meta raw attempts')
+
+
+class Outbox:
+    """
+    Local SQLite spool of rendered emails waiting to be sent to Gmail.
+
+    Preparing a target sheet only renders its emails, as RFC 822 bytes, and stores them
+    here with the row they answer; a separate flush sends them later, at the rate of the
+    sender pool, possibly from another machine holding a copy of the file. Each email
+    is bound to the sender account it was rendered for (its From and signature).
+
+    An email is stored once per target row: spooling a row again while it is pending,
+    or once sent, does nothing. Entries move from `pending` to `sent`, `done` (handled
+    another way, e.g. as a draft) or `failed` after `max_attempts` unsuccessful flushes.
+
+    Attributes:
+        path (str): Location of the SQLite database.
+        max_attempts (int): Flushes an email may fail before it is given up.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Sender -> pending entries, kept in memory as it is asked for every spooled row
+        self._pending = Counter()
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT, spreadsheet_id TEXT, row INTEGER, "
+                "meta TEXT, raw BLOB, status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, "
+                "error TEXT, message_id TEXT, created REAL, sent REAL, "
+                "UNIQUE (spreadsheet_id, row))")
+        self._pending.update(dict(self._db.execute(
+            "SELECT sender, COUNT(*) FROM outbox WHERE status = 'pending' GROUP BY sender").fetchall()))
+
+    def add(self, sender, spreadsheet_id, row, message, meta=None):
+        """
+        Spool the Gmail `message` ({'raw': base64url RFC 822}) of a target row; returns its id.
+
+        Returns None when the row already has an email in the outbox.
+        """
+        raw = base64.urlsafe_b64decode(message['raw'])
+        with self._lock, self._db:
+            # A row given up on, or handled another way, can be spooled again
+            cursor = self._db.execute(
+                "INSERT INTO outbox (sender, spreadsheet_id, row, meta, raw, created) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (spreadsheet_id, row) DO UPDATE SET sender = excluded.sender, meta = excluded.meta, "
+                "raw = excluded.raw, created = excluded.created, status = 'pending', attempts = 0, error = NULL "
+                "WHERE status IN ('done', 'failed')",
+                (sender, spreadsheet_id, row, json.dumps(meta or {}, ensure_ascii=False), raw, time()))
+            if not cursor.rowcount:
+                return None
+            self._pending[sender] += 1
+            return self._db.execute("SELECT id FROM outbox WHERE spreadsheet_id = ? AND row = ?",
+                                    (spreadsheet_id, row)).fetchone()[0]
+
+    def pending(self, sender=None):
+        """Pending entries, oldest first, of every sender or of `sender` only."""
+        query = "SELECT id, sender, spreadsheet_id, row, meta, raw, attempts FROM outbox WHERE status = 'pending'"
+        params = ()
+        if sender is not None:
+            query += " AND sender = ?"
+            params = (sender,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id", params).fetchall()
+        return [OutboxEntry(id, sender, spreadsheet_id, row, json.loads(meta), bytes(raw), attempts)
+                for id, sender, spreadsheet_id, row, meta, raw, attempts in rows]
+
+    @staticmethod
+    def message(entry):
+        """Gmail `messages.send` body of an entry."""
+        return {'raw': base64.urlsafe_b64encode(entry.raw).decode('utf-8')}
+
+    def _close(self, entry, status, **fields):
+        assignments = "".join(f", {name} = ?" for name in fields)
+        with self._lock, self._db:
+            cursor = self._db.execute(f"UPDATE outbox SET status = ?{assignments} WHERE id = ? AND status = 'pending'",
+                                      (status, *fields.values(), entry.id))
+            if cursor.rowcount:
+                self._pending[entry.sender] -= 1
+
+    def mark_sent(self, entry, message_id=None):
+        self._close(entry, 'sent', message_id=message_id, sent=time())
+
+    def mark_done(self, entry):
+        self._close(entry, 'done')
+
+    def mark_failed(self, entry, error):
+        """Count a failed flush of `entry`; it stays pending until `max_attempts` is reached."""
+        if entry.attempts + 1 >= self.max_attempts:
+            self._close(entry, 'failed', attempts=entry.attempts + 1, error=str(error))
+            return
+        with self._lock, self._db:
+            self._db.execute("UPDATE outbox SET attempts = attempts + 1, error = ? WHERE id = ?",
+                             (str(error), entry.id))
+
+    def is_pending(self, spreadsheet_id, row):
+        """True when the email of a target row is waiting in the outbox."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM outbox WHERE spreadsheet_id = ? AND row = ? AND status = 'pending'",
+                (spreadsheet_id, row)).fetchone() is not None
+
+    def counts(self):
+        """Status -> number of entries."""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    def pending_count(self, sender):
+        with self._lock:
+            return self._pending[sender]
+
+    def export(self, directory):
+        """Write the pending emails to `directory` as .eml files, to be read or sent by hand; returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for entry in self.pending():
+            path = os.path.join(directory, f"{entry.id:06d} {entry.spreadsheet_id} row {entry.row}.eml")
+            with open(path, 'wb') as file:
+                file.write(entry.raw)
+            paths.append(path)
+        return paths
@@ -0,0 +1,242 @@
+import os
+import struct
+import unicodedata
+import zipfile
+import zlib
+from functools import lru_cache
+
+# A4, in points
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 70.85
+
+# Advance widths of the standard Helvetica fonts for the printable ASCII characters,
+# in 1/1000 of the font size; other letters take the width of their unaccented form
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+OTHER_WIDTHS = {'’': 222, '–': 556, ' ': 278, '°': 400, '€': 556}
+
+FOOTER_LINES = [
+    ("LD GÉNÉALOGIE", True),
+    ("Téléphone : 09 51 47 90 75 – Courriel : contact@ld-genealogie.fr", False),
+    ("Siège social : 23 rue Fernand Rabier, 45000 ORLÉANS – www.ld-genealogie.fr", False),
+    ("SARL au capital de 1000 euros – SIRET  84365622400030", False),
+    ("TVA Intracommunautaire FR64843656224", False),
+    ("Responsabilité civile professionnelle MMAIARD 127120689", False),
+    ("Garantie financière MS AMLIN 2018PFC003", False),
+]
+BORDER_GRAY = 0.745
+
+
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    total = 0
+    for char in text:
+        base = unicodedata.normalize('NFD', char)[0]
+        if 32 <= ord(base) <= 126:
+            total += widths[ord(base) - 32]
+        else:
+            total += OTHER_WIDTHS.get(char, 556)
+    return total * size / 1000
+
+
+def pdf_string(text):
+    """PDF literal string of `text` in WinAnsiEncoding."""
+    data = text.encode('cp1252', 'replace')
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+@lru_cache(maxsize=None)
+def template_logo(template_path):
+    """PNG logo of the header of template.docx."""
+    with zipfile.ZipFile(template_path) as docx:
+        return docx.read('word/media/image1.png')
+
+
+@lru_cache(maxsize=None)
+def load_png(data):
+    """
+    Decode an 8-bit, non-interlaced PNG into (width, height, colors, pixels, alpha).
+
+    `pixels` are the zlib-compressed gray or RGB samples, `alpha` the compressed alpha
+    channel or None, ready to be used as a PDF image and its soft mask. Decoding is
+    slow in pure Python, so it is only done once per image.
+    """
+    position, idat = 8, b""
+    while position < len(data):
+        length, chunk_type = struct.unpack('>I4s', data[position:position + 8])
+        chunk = data[position + 8:position + 8 + length]
+        if chunk_type == b'IHDR':
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'IDAT':
+            idat += chunk
+        position += length + 12
+    if bit_depth != 8 or interlace or color_type not in (0, 2, 4, 6):
+        raise ValueError("Unsupported PNG image")
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
+    raw = zlib.decompress(idat)
+    stride = width * channels
+    rows, previous = [], bytearray(stride)
+    for y in range(height):
+        filter_type = raw[y * (stride + 1)]
+        row = bytearray(raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        for x in range(stride):
+            left = row[x - channels] if x >= channels else 0
+            up = previous[x]
+            if filter_type == 1:
+                row[x] = (row[x] + left) & 0xff
+            elif filter_type == 2:
+                row[x] = (row[x] + up) & 0xff
+            elif filter_type == 3:
+                row[x] = (row[x] + (left + up) // 2) & 0xff
+            elif filter_type == 4:
+                up_left = previous[x - channels] if x >= channels else 0
+                estimate = left + up - up_left
+                distances = abs(estimate - left), abs(estimate - up), abs(estimate - up_left)
+                predictor = left if distances[0] <= distances[1] and distances[0] <= distances[2] \
+                    else up if distances[1] <= distances[2] else up_left
+                row[x] = (row[x] + predictor) & 0xff
+        rows.append(row)
+        previous = row
+    pixels = b"".join(rows)
+    if color_type in (4, 6):
+        colors = channels - 1
+        color = bytearray()
+        for offset in range(0, len(pixels), channels):
+            color += pixels[offset:offset + colors]
+        return width, height, colors, zlib.compress(bytes(color)), zlib.compress(pixels[colors::channels])
+    return width, height, channels, zlib.compress(pixels), None
+
+
+class PdfWriter:
+    """
+    Minimal PDF 1.4 writer: one page, the standard Helvetica fonts and images.
+
+    Drawing methods take coordinates from the top left corner of the page, in points.
+    """
+
+    def __init__(self):
+        self.objects = []
+        self.content = []
+        self.images = {}
+
+    def add_object(self, data):
+        self.objects.append(data)
+        return len(self.objects)
+
+    def text(self, x, y, text, size, bold=False, align='left'):
+        """Draw `text` with its baseline at `y`, starting at `x` (or ending / centered on it)."""
+        if align == 'right':
+            x -= text_width(text, size, bold)
+        elif align == 'center':
+            x -= text_width(text, size, bold) / 2
+        font = b"/F2" if bold else b"/F1"
+        self.content.append(b"BT %s %.2f Tf %.2f %.2f Td %s Tj ET" % (
+            font, size, x, PAGE_HEIGHT - y, pdf_string(text)))
+
+    def rectangle(self, x, y, width, height, line_width, gray):
+        self.content.append(b"q %.2f w %.3f G %.2f %.2f %.2f %.2f re S Q" % (
+            line_width, gray, x, PAGE_HEIGHT - y - height, width, height))
+
+    def image(self, png, x, y, width, height):
+        if png not in self.images:
+            image_width, image_height, colors, pixels, alpha = load_png(png)
+            color_space = b"/DeviceRGB" if colors == 3 else b"/DeviceGray"
+            mask = b""
+            if alpha is not None:
+                mask_id = self.add_object(
+                    b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                    b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream" % (
+                        image_width, image_height, len(alpha), alpha))
+                mask = b" /SMask %d 0 R" % mask_id
+            self.images[png] = self.add_object(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                b"/BitsPerComponent 8 /Filter /FlateDecode%s /Length %d >>\nstream\n%s\nendstream" % (
+                    image_width, image_height, color_space, mask, len(pixels), pixels))
+        name = b"/Im%d" % self.images[png]
+        self.content.append(b"q %.2f 0 0 %.2f %.2f %.2f cm %s Do Q" % (
+            width, height, x, PAGE_HEIGHT - y - height, name))
+
+    def save(self, path):
+        content = zlib.compress(b"\n".join(self.content))
+        content_id = self.add_object(b"<< /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream" % (
+            len(content), content))
+        fonts = [self.add_object(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name)
+                 for name in (b"Helvetica", b"Helvetica-Bold")]
+        images = b" ".join(b"/Im%d %d 0 R" % (image_id, image_id) for image_id in self.images.values())
+        pages_id = len(self.objects) + 2
+        page_id = self.add_object(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> /XObject << %s >> >> >>" % (
+                pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, fonts[0], fonts[1], images))
+        self.add_object(b"<< /Type /Pages /Kids [%d 0 R] /Count 1 >>" % page_id)
+        catalog_id = self.add_object(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, data in enumerate(self.objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n%s\nendobj\n" % (number, data)
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.objects) + 1)
+        output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(self.objects) + 1, catalog_id, xref)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(output)
+        os.replace(temp_path, path)
+
+
+def render_invoice(path, logo, date, name, facture_number, ht, tva, tcc, paid_date):
+    """Write the invoice PDF, laid out like template.docx, to `path`; `logo` is the PNG of its header."""
+    pdf = PdfWriter()
+    right = PAGE_WIDTH - MARGIN
+
+    # Header: logo, date, recipient block and subject
+    pdf.image(logo, MARGIN - 25.2, 36.15, 126.9, 133.05)
+    pdf.text(right, 45, f"le {date}", 9, align='right')
+    pdf.text(right - text_width(f" le {date}", 9), 45, "Orléans,", 9, bold=True, align='right')
+    pdf.text(MARGIN + 284.25, 117, "Recherche de bénéficiaires d’actifs", 10, bold=True)
+    pdf.text(MARGIN + 284.25, 130, name, 10, bold=True)
+    pdf.text(MARGIN, 190, "Objet : Recherche de bénéficiaires d’actifs", 7)
+
+    pdf.text(PAGE_WIDTH / 2, 290, f"FACTURE N° {facture_number}", 16, bold=True, align='center')
+
+    # Fees table: a merged first row, then label / amount rows
+    left = MARGIN - 8.25
+    label_width, amount_width = 366.2, 122.85
+    top = 320
+    pdf.rectangle(left, top, label_width + amount_width, 56, 3, BORDER_GRAY)
+    pdf.text(left + (label_width + amount_width) / 2, top + 25, " Recherche de bénéficiaire d’actifs", 9, align='center')
+    pdf.text(left + (label_width + amount_width) / 2, top + 38, name, 9, align='center')
+    top += 56
+    for label, amount in (("HONORAIRES HT", ht), ("TVA (20%)", tva), ("HONORAIRES TTC", tcc)):
+        pdf.rectangle(left, top, label_width, 24, 3, BORDER_GRAY)
+        pdf.rectangle(left + label_width, top, amount_width, 24, 3, BORDER_GRAY)
+        pdf.text(left + 6, top + 16, label, 10, bold=True)
+        pdf.text(left + label_width + amount_width - 6, top + 16, amount, 10, align='right')
+        top += 24
+
+    pdf.text(MARGIN, top + 30, f"Facture acquittée par prélèvement le {paid_date}", 9, bold=True)
+
+    # Footer
+    y = PAGE_HEIGHT - 35.4 - 10 * len(FOOTER_LINES)
+    for line, bold in FOOTER_LINES:
+        pdf.text(PAGE_WIDTH / 2, y, line, 8, bold=bold, align='center')
+        y += 10
+    pdf.save(path)
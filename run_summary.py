@@ -0,0 +1,32 @@
+import threading
+from collections import Counter
+
+
+class RunSummary:
+    """
+    Outcomes of a run (emails sent, drafts created, invoices...) and the errors met,
+    reported as JSON when the app runs from the command line.
+
+    Thread-safe, as emails are sent from the scheduler threads.
+
+    Attributes:
+        counts (Counter): Outcome name -> number of rows.
+        errors (list): {'where', 'error'} dicts, in the order they happened.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def add(self, outcome, count=1):
+        with self._lock:
+            self.counts[outcome] += count
+
+    def error(self, where, error):
+        with self._lock:
+            self.errors.append({'where': str(where), 'error': str(error)})
+
+    def as_dict(self):
+        with self._lock:
+            return {'counts': dict(self.counts), 'errors': list(self.errors)}
@@ -0,0 +1,126 @@
+import queue
+import random
+import threading
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity`; `acquire()` blocks until a
+    token is available and takes it. Each acquisition shifts the next token by a random
+    offset of up to `jitter` seconds either way, so with `capacity=1` the releases are
+    spaced `1 / rate ± jitter` seconds apart.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens, i.e. the largest burst.
+        jitter (float): Maximum random offset, in seconds, applied after each acquisition.
+    """
+
+    def __init__(self, rate, capacity=1, jitter=0.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.jitter = jitter
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, tokens=1):
+        """Seconds until `tokens` tokens are available."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens=1, interrupt: threading.Event = None):
+        """
+        Wait for `tokens` tokens and take them. Returns False if `interrupt` was set while waiting.
+
+        A request larger than `capacity` waits for a full bucket and takes it.
+        """
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens + random.uniform(-self.jitter, self.jitter) * self.rate
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if interrupt is None:
+                sleep(wait)
+            elif interrupt.wait(wait):
+                return False
+
+
+class SendScheduler:
+    """
+    Runs queued send jobs in a background thread, one per token of a `TokenBucket`.
+
+    The caller keeps preparing messages while the jobs wait for their slot. A job is
+    any callable; exceptions raised by a job are printed and don't stop the scheduler.
+
+    Attributes:
+        bucket (TokenBucket): Rate limiter the jobs are released through.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._generation = 0
+        self._pending = 0
+        self._worker = None
+
+    def submit(self, job):
+        with self._lock:
+            self._pending += 1
+            self._queue.put((self._generation, job))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def queue_depth(self):
+        """Number of jobs submitted and not finished yet."""
+        return self._pending
+
+    def estimated_finish(self):
+        depth = self.queue_depth()
+        if not depth:
+            return datetime.now()
+        return datetime.now() + timedelta(seconds=self.bucket.delay() + (depth - 1) / self.bucket.rate)
+
+    def cancel(self):
+        """Drop the jobs still waiting for a token and wait for the running one to end."""
+        with self._lock:
+            self._generation += 1
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                self._queue.task_done()
+            self._wakeup.set()
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            generation, job = self._queue.get()
+            while generation == self._generation and not self.bucket.acquire(interrupt=self._wakeup):
+                self._wakeup.clear()
+            if generation == self._generation:
+                try:
+                    job()
+                except Exception as e:
+                    print(f"Error in scheduled send : {e}")
+            with self._lock:
+                self._pending -= 1
+            self._queue.task_done()
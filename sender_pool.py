@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+from datetime import date, datetime
+from time import sleep
+
+from scheduler import SendScheduler
+
+
+class Sender:
+    """
+    One Gmail account emails can be sent from, with its own rate limit and signature.
+
+    Attributes:
+        email (str): Address of the account.
+        build_service (callable): Builds the Gmail API client of the account, or any object
+            with the same `users().messages().send(...).execute()` interface.
+        messages (MessageFactory): Builds the emails with the account's signature.
+        scheduler (SendScheduler): Queue the account's emails are released through.
+    """
+
+    def __init__(self, email, build_service, messages, bucket):
+        self.email = email
+        self.build_service = build_service
+        self.messages = messages
+        self.scheduler = SendScheduler(bucket)
+        self._service = None
+        self._lock = threading.Lock()
+
+    @property
+    def service(self):
+        """Gmail API client of the account, built on its first email."""
+        with self._lock:
+            if self._service is None:
+                self._service = self.build_service()
+            return self._service
+
+    def send_request(self, message):
+        """Gmail `messages.send` request of `message` from this account, to be executed."""
+        return self.service.users().messages().send(userId=self.email, body=message)
+
+
+class SenderPool:
+    """
+    Spreads queued emails over several sender accounts.
+
+    Each sender has its own `SendScheduler`, so its own rate limit, and a daily quota of
+    `daily_limit` emails, counted in the JSON file `quota_path` so it holds across runs.
+    A job goes to the sender with the fewest emails queued, then sent today, among the
+    ones with quota left.
+
+    The pool is used like a `SendScheduler`, except that jobs are called with their
+    `Sender` and return a true value when they actually sent an email.
+
+    Attributes:
+        senders (list): The `Sender` accounts.
+        daily_limit (int): Emails each sender may send per day.
+        quota_path (str): Location of the daily counters, None to keep them in memory.
+    """
+
+    def __init__(self, senders, daily_limit, quota_path=None):
+        self.senders = list(senders)
+        self.daily_limit = daily_limit
+        self.quota_path = quota_path
+        self._lock = threading.Lock()
+        self._sent = {}
+        if quota_path is not None:
+            try:
+                with open(quota_path, 'r', encoding='utf-8') as file:
+                    self._sent = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+    def _today(self):
+        return self._sent.setdefault(date.today().isoformat(), {})
+
+    def _save(self):
+        if self.quota_path is None:
+            return
+        # Only today's counters are worth keeping
+        self._sent = {date.today().isoformat(): self._today()}
+        temp_path = self.quota_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._sent, file)
+        os.replace(temp_path, self.quota_path)
+
+    def sent_today(self, sender):
+        with self._lock:
+            return self._today().get(sender.email, 0)
+
+    def remaining(self, sender):
+        """Emails `sender` can still be given today, counting the ones already queued."""
+        return self.daily_limit - self.sent_today(sender) - sender.scheduler.queue_depth()
+
+    def submit(self, job, sender=None):
+        """
+        Queue `job(sender)` on the least loaded sender, or on `sender` when given.
+
+        Returns the sender, or None when every quota (the quota of `sender`) is used.
+        """
+        with self._lock:
+            candidates = self.senders if sender is None else [sender]
+            available = [sender for sender in candidates
+                         if self.daily_limit - self._today().get(sender.email, 0) - sender.scheduler.queue_depth() > 0]
+            if not available:
+                return None
+            sender = min(available, key=lambda sender: (sender.scheduler.queue_depth(),
+                                                        self._today().get(sender.email, 0)))
+
+            def run():
+                if job(sender):
+                    with self._lock:
+                        today = self._today()
+                        today[sender.email] = today.get(sender.email, 0) + 1
+                        self._save()
+
+            sender.scheduler.submit(run)
+            return sender
+
+    def queue_depth(self):
+        return sum(sender.scheduler.queue_depth() for sender in self.senders)
+
+    def estimated_finish(self):
+        return max((sender.scheduler.estimated_finish() for sender in self.senders), default=datetime.now())
+
+    def status(self):
+        return (f"Emails in queue : {self.queue_depth()}    Senders : {len(self.senders)}    "
+                f"Estimated finish : {self.estimated_finish():%H:%M:%S}")
+
+    def join(self, show_progress=True):
+        """Wait for every submitted job, printing the queue status every second."""
+        while self.queue_depth():
+            if show_progress:
+                print(self.status() + "   ", end="\r")
+            sleep(1)
+        if show_progress:
+            print()
+
+    def cancel(self):
+        for sender in self.senders:
+            sender.scheduler.cancel()
@@ -0,0 +1,113 @@
+import atexit
+import threading
+from time import monotonic
+
+from gspread.utils import ValueInputOption, rowcol_to_a1
+
+
+class PendingWrites(Exception):
+    """Updates of a worksheet could not be written, and must be before its rows move."""
+
+
+class SheetWriteBuffer:
+    """
+    Collects cell updates per worksheet and writes them back with one batch_update.
+
+    Updates are keyed by (row, col) so a cell written twice before a flush is only
+    sent once, and neighbouring cells of the same row are merged into a single range.
+    The buffer flushes itself when `max_rows` distinct rows are pending or when
+    `interval` seconds have passed since the last flush, and once more at exit.
+
+    Attributes:
+        max_rows (int): Number of pending rows that triggers a flush.
+        interval (float): Maximum number of seconds between two flushes.
+        executor (ApiExecutor): Optional retry wrapper the batch updates go through.
+        on_flush (callable): Optional `on_flush(worksheet, cells)` called with the
+            {(row, col): value} updates of a worksheet once they are written.
+    """
+
+    def __init__(self, max_rows=20, interval=60, executor=None, on_flush=None):
+        self.max_rows = max_rows
+        self.interval = interval
+        self.executor = executor
+        self.on_flush = on_flush
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._last_flush = monotonic()
+        atexit.register(self.flush)
+
+    def update_cell(self, worksheet, row, col, value):
+        """Queue a single cell update, same arguments as `Worksheet.update_cell`."""
+        with self._lock:
+            key = (worksheet.spreadsheet.id, worksheet.id)
+            if key not in self._pending:
+                self._pending[key] = (worksheet, {})
+            self._pending[key][1][(row, col)] = value
+            if self.pending_rows() >= self.max_rows or monotonic() - self._last_flush >= self.interval:
+                self.flush()
+
+    def has_pending(self, worksheet):
+        with self._lock:
+            return bool(self._pending.get((worksheet.spreadsheet.id, worksheet.id), (None, {}))[1])
+
+    def pending_rows(self):
+        with self._lock:
+            return sum(len({row for row, _ in cells}) for _, cells in self._pending.values())
+
+    def flush(self, worksheet=None):
+        """
+        Write the pending updates of `worksheet` (or of every worksheet) to the sheet.
+
+        Updates that fail to be written are kept and retried on the next flush.
+        """
+        with self._lock:
+            for key, (pending_worksheet, cells) in list(self._pending.items()):
+                if worksheet is not None and key != (worksheet.spreadsheet.id, worksheet.id):
+                    continue
+                if not cells:
+                    continue
+                data = merge_cell_ranges(cells)
+
+                def write(worksheet=pending_worksheet, data=data):
+                    return worksheet.batch_update(data, value_input_option=ValueInputOption.user_entered)
+
+                try:
+                    if self.executor is not None:
+                        self.executor.execute('sheets_write', write, endpoint='sheets_write.batch_update')
+                    else:
+                        write()
+                except Exception as e:
+                    print(f"Error writing to {pending_worksheet.title}: {e}")
+                    continue
+                del self._pending[key]
+                if self.on_flush is not None:
+                    self.on_flush(pending_worksheet, cells)
+            if worksheet is None:
+                self._last_flush = monotonic()
+
+
+def merge_cell_ranges(cells):
+    """
+    Turn a {(row, col): value} mapping into batch_update data.
+
+    Consecutive columns of the same row become one range, e.g. K12 and L12 are
+    written as K12:L12.
+    """
+    data = []
+    for row in sorted({row for row, _ in cells}):
+        cols = sorted(col for cell_row, col in cells if cell_row == row)
+        start = previous = cols[0]
+        for col in cols[1:] + [None]:
+            if col is not None and col == previous + 1:
+                previous = col
+                continue
+            cell_range = rowcol_to_a1(row, start)
+            if previous != start:
+                cell_range += f":{rowcol_to_a1(row, previous)}"
+            data.append({
+                'range': cell_range,
+                'values': [[cells[(row, c)] for c in range(start, previous + 1)]],
+            })
+            if col is not None:
+                start = previous = col
+    return data
@@ -0,0 +1,119 @@
+import json
+import sqlite3
+import threading
+from time import time
+
+
+class SheetSnapshotStore:
+    """
+    Local SQLite copy of worksheet values, kept per spreadsheet key and worksheet.
+
+    Before a sheet is read, the Drive revision of its spreadsheet is compared with the
+    one the snapshot was taken at; the rows are only downloaded again when it changed.
+    Drive doesn't say which cells changed, so a changed sheet is downloaded in full.
+
+    A snapshot may hold only some of the columns (`columns`, a list of column numbers),
+    in which case it is only used by readers asking for those same columns.
+
+    Attributes:
+        path (str): Location of the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "spreadsheet_id TEXT, worksheet_id INTEGER, version TEXT, fetched REAL, columns TEXT DEFAULT '', "
+                "PRIMARY KEY (spreadsheet_id, worksheet_id))")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rows ("
+                "spreadsheet_id TEXT, worksheet_id INTEGER, row INTEGER, data TEXT, "
+                "PRIMARY KEY (spreadsheet_id, worksheet_id, row))")
+
+    @staticmethod
+    def _columns_key(columns):
+        return ",".join(str(col) for col in sorted(columns)) if columns else ""
+
+    def version(self, spreadsheet_id, worksheet_id, columns=None):
+        """Revision the stored snapshot of `columns` was taken at, or None."""
+        with self._lock:
+            result = self._db.execute(
+                "SELECT version FROM snapshots WHERE spreadsheet_id = ? AND worksheet_id = ? AND columns = ?",
+                (spreadsheet_id, worksheet_id, self._columns_key(columns))).fetchone()
+        return result[0] if result else None
+
+    def rows(self, spreadsheet_id, worksheet_id):
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT data FROM rows WHERE spreadsheet_id = ? AND worksheet_id = ? ORDER BY row",
+                (spreadsheet_id, worksheet_id))
+            return [json.loads(data) for data, in cursor]
+
+    def clear(self, spreadsheet_id, worksheet_id):
+        """Drop the snapshot of a worksheet before it is written again."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM snapshots WHERE spreadsheet_id = ? AND worksheet_id = ?",
+                             (spreadsheet_id, worksheet_id))
+            self._db.execute("DELETE FROM rows WHERE spreadsheet_id = ? AND worksheet_id = ?",
+                             (spreadsheet_id, worksheet_id))
+
+    def append(self, spreadsheet_id, worksheet_id, first_row, rows):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                ((spreadsheet_id, worksheet_id, row, json.dumps(values, ensure_ascii=False))
+                 for row, values in enumerate(rows, start=first_row)))
+
+    def commit(self, spreadsheet_id, worksheet_id, version, columns=None):
+        """Mark the rows appended since `clear` as the snapshot at `version`."""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                             (spreadsheet_id, worksheet_id, str(version), time(), self._columns_key(columns)))
+
+    def save(self, spreadsheet_id, worksheet_id, version, rows, columns=None):
+        self.clear(spreadsheet_id, worksheet_id)
+        self.append(spreadsheet_id, worksheet_id, 1, rows)
+        self.commit(spreadsheet_id, worksheet_id, version, columns)
+
+    def get_all_values(self, worksheet, version, fetch):
+        """
+        Values of `worksheet` like `get_all_values()`, from the snapshot when it is current.
+
+        `version` is the current Drive revision of the spreadsheet and `fetch()` downloads
+        the values when the snapshot is missing or older.
+        """
+        spreadsheet_id = worksheet.spreadsheet.id
+        if self.version(spreadsheet_id, worksheet.id) == str(version):
+            return self.rows(spreadsheet_id, worksheet.id)
+        rows = fetch()
+        self.save(spreadsheet_id, worksheet.id, version, rows)
+        return rows
+
+    def iter_values(self, worksheet, version, columns, stream):
+        """
+        Yield (row number, row values) of `worksheet`, from the snapshot when it is current.
+
+        Otherwise the rows come from `stream()`, an iterator of (row number, row values)
+        such as `sheet_stream.iter_rows`, and are stored block by block as they arrive.
+        The new snapshot only becomes valid once the stream has been read to the end.
+        """
+        spreadsheet_id = worksheet.spreadsheet.id
+        if self.version(spreadsheet_id, worksheet.id, columns) == str(version):
+            yield from enumerate(self.rows(spreadsheet_id, worksheet.id), start=1)
+            return
+        self.clear(spreadsheet_id, worksheet.id)
+        block, block_start = [], None
+        for row_number, row in stream():
+            if block_start is None:
+                block_start = row_number
+            block.append(row)
+            if len(block) >= 500:
+                self.append(spreadsheet_id, worksheet.id, block_start, block)
+                block, block_start = [], None
+            yield row_number, row
+        if block:
+            self.append(spreadsheet_id, worksheet.id, block_start, block)
+        self.commit(spreadsheet_id, worksheet.id, version, columns)
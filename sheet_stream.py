@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from gspread.utils import rowcol_to_a1
+
+
+def column_ranges(columns):
+    """Group column numbers into contiguous (first, last) spans, e.g. [1, 5, 6, 7] -> [(1, 1), (5, 7)]."""
+    spans = []
+    for col in sorted(set(columns)):
+        if spans and spans[-1][1] == col - 1:
+            spans[-1][1] = col
+        else:
+            spans.append([col, col])
+    return [tuple(span) for span in spans]
+
+
+def iter_rows(worksheet, columns, block_rows=500, executor=None, first_row=1):
+    """
+    Yield (row number, row values) for every row of `worksheet`, reading it block by block.
+
+    Only `columns` (1-based column numbers) are downloaded, with one batch_get per block of
+    `block_rows` rows; the other cells of the yielded rows are ''. The next block is
+    fetched in the background while the rows of the current one are processed.
+
+    Args:
+        worksheet (gspread.Worksheet): Sheet to read, its `row_count` bounds the reading.
+        columns (list): Column numbers to download.
+        block_rows (int): Number of rows per request.
+        executor (ApiExecutor): Optional retry wrapper the requests go through.
+        first_row (int): Row to start from.
+    """
+    spans = column_ranges(columns)
+    width = spans[-1][1]
+    last_row = worksheet.row_count
+
+    def fetch(start):
+        end = min(start + block_rows - 1, last_row)
+        ranges = [f"{rowcol_to_a1(start, first)}:{rowcol_to_a1(end, last)}" for first, last in spans]
+        value_ranges = executor.execute('sheets_read', lambda: worksheet.batch_get(ranges),
+                                        endpoint='sheets_read.batch_get') \
+            if executor is not None else worksheet.batch_get(ranges)
+        rows = [[''] * width for _ in range(end - start + 1)]
+        for (first, _), values in zip(spans, value_ranges):
+            for offset, cells in enumerate(values):
+                rows[offset][first - 1:first - 1 + len(cells)] = cells
+        return start, rows
+
+    if first_row > last_row:
+        return
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        block = pool.submit(fetch, first_row)
+        while block is not None:
+            start, rows = block.result()
+            next_start = start + len(rows)
+            block = pool.submit(fetch, next_start) if next_start <= last_row else None
+            for offset, row in enumerate(rows):
+                yield start + offset, row
@@ -0,0 +1,65 @@
+import unittest
+from types import SimpleNamespace
+
+from api_retry import ApiExecutor
+
+
+class HttpError(Exception):
+    """Error of a Google API call, with the `response` gspread and requests errors carry."""
+
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+class ApiExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.executor = ApiExecutor(quotas={}, max_retries=3, base_delay=1.0, sleep=self.sleeps.append)
+
+    def failing(self, *errors, result="ok"):
+        errors = list(errors)
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return result
+        return call
+
+    def test_retry_after_is_waited(self):
+        call = self.failing(HttpError(429, {'Retry-After': '7'}))
+        self.assertEqual(self.executor.execute('gmail', call), "ok")
+        self.assertEqual(self.sleeps, [7.0])
+
+    def test_backoff_without_retry_after(self):
+        call = self.failing(HttpError(503), HttpError(500), HttpError(502))
+        self.assertEqual(self.executor.execute('gmail', call), "ok")
+        self.assertEqual(len(self.sleeps), 3)
+        for attempt, delay in enumerate(self.sleeps):
+            self.assertTrue(0 <= delay <= 2 ** attempt)
+
+    def test_last_error_raised_after_max_retries(self):
+        call = self.failing(*[HttpError(503) for _ in range(4)])
+        with self.assertRaises(HttpError):
+            self.executor.execute('gmail', call)
+        self.assertEqual(len(self.sleeps), 3)
+
+    def test_fatal_error_not_retried(self):
+        with self.assertRaises(HttpError):
+            self.executor.execute('gmail', self.failing(HttpError(400)))
+        self.assertEqual(self.sleeps, [])
+
+    def test_call_that_is_not_idempotent(self):
+        with self.assertRaises(HttpError):
+            self.executor.execute('gmail', self.failing(HttpError(503)), idempotent=False)
+        with self.assertRaises(TimeoutError):
+            self.executor.execute('gmail', self.failing(TimeoutError()), idempotent=False)
+        self.assertEqual(self.sleeps, [])
+        call = self.failing(HttpError(429, {'Retry-After': '2'}), ConnectionRefusedError())
+        self.assertEqual(self.executor.execute('gmail', call, idempotent=False), "ok")
+        self.assertEqual(len(self.sleeps), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import base64
+import json
+import re
+import threading
+import unittest
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+from googleapiclient.discovery import build
+
+from api_retry import ApiExecutor
+from gmail_batch import DraftBatch
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    """
+    Gmail batch endpoint: each drafts.create part is answered with a draft whose id is the raw message.
+
+    Raw messages listed in `server.unavailable` get a 503 the first time they are sent.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        batch = BytesParser().parsebytes(b"Content-Type: " + self.headers['Content-Type'].encode() + b"\r\n\r\n" + body)
+        boundary = "batch_response"
+        parts = []
+        for part in batch.get_payload():
+            request = part.get_payload()
+            message = json.loads(re.split(r"\r?\n\r?\n", request, maxsplit=1)[1])
+            raw = base64.urlsafe_b64decode(message['message']['raw']).decode()
+            self.server.received.append(raw)
+            if raw in self.server.unavailable:
+                self.server.unavailable.remove(raw)
+                response = 'HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n\r\n' \
+                           '{"error": {"code": 503, "message": "Backend Error"}}'
+            else:
+                response = 'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n' + json.dumps({'id': f"draft-{raw}"})
+            content_id = part['Content-ID'][1:-1]
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\n{response}\r\n")
+        content = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        self.send_response(200)
+        self.send_header('Content-Type', f"multipart/mixed; boundary={boundary}")
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class DraftBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBatchHandler)
+        self.server.received = []
+        self.server.unavailable = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.gmail = build('gmail', 'v1', http=httplib2.Http(), static_discovery=True, cache_discovery=False)
+        self.results = {}
+
+    def batch(self, executor=None, batch_size=50):
+        return DraftBatch(self.gmail, 'me', lambda key, status, error: self.results.__setitem__(key, (status, error)),
+                          batch_size, batch_uri=f"http://127.0.0.1:{self.server.server_address[1]}/batch",
+                          http=httplib2.Http(), executor=executor)
+
+    def message(self, text):
+        return {'raw': base64.urlsafe_b64encode(text.encode()).decode()}
+
+    def test_results_go_back_to_their_rows(self):
+        drafts = self.batch(batch_size=3)
+        for row in range(10, 17):
+            drafts.add(self.message(f"row {row}"), row)
+        drafts.flush()
+        self.assertEqual(len(drafts), 0)
+        self.assertEqual({row: status['id'] for row, (status, error) in self.results.items()},
+                         {row: f"draft-row {row}" for row in range(10, 17)})
+
+    def test_unavailable_draft_is_sent_again(self):
+        self.server.unavailable.add("row 11")
+        drafts = self.batch(ApiExecutor(quotas={}, sleep=lambda delay: None))
+        for row in (10, 11, 12):
+            drafts.add(self.message(f"row {row}"), row)
+        drafts.flush()
+        self.assertEqual(self.server.received.count("row 11"), 2)
+        self.assertEqual(self.server.received.count("row 10"), 1)
+        self.assertEqual(self.results[11], ({'id': "draft-row 11"}, None))
+
+    def test_unavailable_draft_is_reported_without_executor(self):
+        self.server.unavailable.add("row 11")
+        drafts = self.batch()
+        for row in (10, 11):
+            drafts.add(self.message(f"row {row}"), row)
+        drafts.flush()
+        status, error = self.results[11]
+        self.assertIsNone(status)
+        self.assertEqual(error.resp.status, 503)
+        self.assertEqual(self.results[10][0], {'id': "draft-row 10"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from notary_index import AmbiguousNotary, NotaryIndex, UnconfirmedNotary
+
+
+def notary_row(first_name, last_name, email="", status="Not contacted"):
+    return ["", first_name, last_name, "", "", "", f"{first_name} {last_name}", "", email, "", status, "-", "-", "-"]
+
+
+class NotaryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NotaryIndex([
+            ["", "Prénom", "Nom"],
+            notary_row("Jeanne", "DUPONT", "jeanne.dupont@notaires.fr"),
+            notary_row("Marc", "LEROY", "marc.leroy@notaires.fr"),
+            notary_row("Marie", "MARTIN", "marie.martin@notaires.fr"),
+            notary_row("Jean Pierre Marie", "DURAND", "etude.durand@notaires.fr\njpm.durand@notaires.fr"),
+            notary_row("Jean-Pierre", "MARTIN", "jp.martin@notaires.fr"),
+            notary_row("Pierre", "DUPONT", "pierre.dupont@notaires.fr"),
+            notary_row("François", "DE LA FONTAINE", "f.fontaine@notaires.fr"),
+        ])
+
+    def match(self, first_name, last_name, email=None):
+        return self.index.match(first_name, last_name, 0.85, 0.05, email)[0]
+
+    def test_exact_names_match_without_email(self):
+        self.assertEqual(self.match("Jeanne", "DUPONT"), 2)
+        self.assertEqual(self.match("jeanne", "Dupont"), 2)
+        self.assertEqual(self.match("Francois", "DE LA FONTAINE"), 8)
+
+    def test_other_first_names_are_other_notaries(self):
+        self.assertIsNone(self.match("Jean", "DUPONT", "jean.dupont@notaires.fr"))
+        self.assertIsNone(self.match("Marcel", "LEROY", "marcel.leroy@notaires.fr"))
+        self.assertIsNone(self.match("Marie-Claire", "MARTIN", "mc.martin@notaires.fr"))
+
+    def test_close_names_need_the_email(self):
+        for first_name, last_name in [("Jean-Pierre", "MARTINEZ"), ("Pierre", "DUPOND")]:
+            with self.assertRaises(UnconfirmedNotary) as raised:
+                self.match(first_name, last_name, "someone.else@notaires.fr")
+            self.assertIsInstance(raised.exception, AmbiguousNotary)
+        with self.assertRaises(UnconfirmedNotary):
+            self.match("Pierre", "DUPOND")
+
+    def test_close_names_with_the_email(self):
+        self.assertEqual(self.match("Pierre", "DUPOND", "Pierre.Dupont@notaires.fr"), 7)
+        self.assertEqual(self.match("Jean-Pierre", "DURAND", "jpm.durand@notaires.fr"), 5)
+        self.assertEqual(self.match("Francois", "FONTAINE DE LA", "f.fontaine@notaires.fr"), 8)
+        self.assertEqual(self.match("Jeane", "DUPONT", "jeanne.dupont@notaires.fr"), 2)
+
+    def test_several_notaries_with_the_email(self):
+        self.index.insert_row(notary_row("Pierre", "DUPONS", "pierre.dupont@notaires.fr"), 9)
+        with self.assertRaises(AmbiguousNotary) as raised:
+            self.match("Pierre", "DUPONX", "pierre.dupont@notaires.fr")
+        self.assertNotIsInstance(raised.exception, UnconfirmedNotary)
+        self.assertEqual(sorted(raised.exception.rows), [7, 9])
+
+    def test_insert_row_shifts_the_rows_below(self):
+        self.assertEqual(self.index.next_row(), 9)
+        self.index.insert_row(notary_row("Paul", "BERNARD", "p.bernard@notaires.fr"), 3)
+        self.assertEqual(self.match("Paul", "BERNARD"), 3)
+        self.assertEqual(self.match("Jeanne", "DUPONT"), 2)
+        self.assertEqual(self.match("Marc", "LEROY"), 4)
+        self.assertEqual(self.match("Pierre", "DUPOND", "pierre.dupont@notaires.fr"), 8)
+        self.assertEqual(self.index.rows[3][2], "LEROY")
+        self.assertEqual(self.index.next_row(), 10)
+
+    def test_update_cell_renames(self):
+        self.index.update_cell(3, 2, "Marcel")
+        self.assertIsNone(self.index.find("Marc", "LEROY")[0])
+        self.assertEqual(self.match("Marcel", "LEROY"), 3)
+        self.index.update_cell(3, 10, "marcel.leroy@notaires.fr")
+        self.assertTrue(self.index.has_email(3, "marcel.leroy@notaires.fr"))
+
+
+if __name__ == '__main__':
+    unittest.main()
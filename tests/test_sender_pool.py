@@ -0,0 +1,128 @@
+import base64
+import os
+import tempfile
+import threading
+import unittest
+from email import message_from_bytes
+from unittest import mock
+
+import auto_email
+from auto_email import render_signature, resource_path, send_email
+from email_templates import MessageFactory
+from scheduler import TokenBucket
+from sender_pool import Sender, SenderPool
+
+
+class FakeGmail:
+    """Gmail API client whose `users().messages().send(...).execute()` records the message it is given."""
+
+    def __init__(self, sent):
+        self.sent = sent
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        return mock.Mock(execute=lambda: self.sent.append((userId, body)) or {'id': f"sent-{len(self.sent)}"})
+
+
+class SenderPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.quota_path = os.path.join(directory.name, "quota.json")
+        self.senders = [Sender(email, None, None, TokenBucket(1000, capacity=1000)) for email in ("a@x", "b@x")]
+        self.gate = threading.Event()
+        self.sent = []
+
+    def tearDown(self):
+        self.gate.set()
+
+    def job(self, sender):
+        self.gate.wait()
+        self.sent.append(sender.email)
+        return True
+
+    def test_jobs_go_to_the_least_loaded_sender_within_quota(self):
+        pool = SenderPool(self.senders, daily_limit=2, quota_path=self.quota_path)
+        assigned = [pool.submit(self.job) for _ in range(5)]
+        self.assertEqual([sender.email for sender in assigned[:4]], ["a@x", "b@x", "a@x", "b@x"])
+        self.assertIsNone(assigned[4])
+        self.gate.set()
+        pool.join(show_progress=False)
+        self.assertEqual(sorted(self.sent), ["a@x", "a@x", "b@x", "b@x"])
+        # The counters hold across runs
+        pool = SenderPool(self.senders, daily_limit=2, quota_path=self.quota_path)
+        self.assertEqual(pool.sent_today(self.senders[0]), 2)
+        self.assertIsNone(pool.submit(self.job))
+
+    def test_job_on_a_given_sender(self):
+        pool = SenderPool(self.senders, daily_limit=1)
+        self.assertIs(pool.submit(self.job, self.senders[1]), self.senders[1])
+        self.assertIsNone(pool.submit(self.job, self.senders[1]))
+        self.assertIs(pool.submit(self.job), self.senders[0])
+        self.gate.set()
+        pool.join(show_progress=False)
+
+    def test_unsent_jobs_are_not_counted(self):
+        pool = SenderPool(self.senders, daily_limit=1)
+        pool.submit(lambda sender: None)
+        pool.join(show_progress=False)
+        self.assertEqual(pool.sent_today(self.senders[0]), 0)
+        self.assertEqual(pool.remaining(self.senders[0]), 1)
+
+
+class SenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.builds = []
+        self.senders = [Sender(email, self.build_service(email),
+                               MessageFactory(render_signature(name, phone), resource_path("attachment.pdf")),
+                               TokenBucket(1000, capacity=1000))
+                        for email, name, phone in [("a@x", "Alice MARTIN", "6 11 11 11 11"),
+                                                   ("b@x", "Bruno DUPONT", "6 22 22 22 22")]]
+        patch = mock.patch.object(auto_email, 'EMAIL_PAUSE', 0)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def build_service(self, email):
+        def build():
+            self.builds.append(email)
+            return FakeGmail(self.sent)
+        return build
+
+    def job(self, sender):
+        message = sender.messages.notary(sender.email, "etude@notaires.fr", "Paul BERNARD", "BERNARD", "DURAND", "don")
+        return send_email(message, sender)
+
+    def test_each_sender_sends_with_its_own_signature(self):
+        pool = SenderPool(self.senders, daily_limit=10)
+        for _ in range(4):
+            pool.submit(self.job)
+        pool.join(show_progress=False)
+        self.assertEqual(len(self.sent), 4)
+        for user_id, body in self.sent:
+            message = message_from_bytes(base64.urlsafe_b64decode(body['raw']))
+            html = message.get_payload(0).get_payload(decode=True).decode()
+            self.assertEqual(message['From'], user_id)
+            if user_id == "a@x":
+                self.assertIn("Alice MARTIN", html)
+                self.assertIn("+33 6 11 11 11 11", html)
+                self.assertNotIn("Bruno DUPONT", html)
+            else:
+                self.assertEqual(user_id, "b@x")
+                self.assertIn("Bruno DUPONT", html)
+                self.assertIn("+33 6 22 22 22 22", html)
+                self.assertNotIn("Alice MARTIN", html)
+        self.assertEqual(sorted(user_id for user_id, body in self.sent), ["a@x", "a@x", "b@x", "b@x"])
+        # Each Gmail client is built once, on the first email of its account
+        self.assertEqual(sorted(self.builds), ["a@x", "b@x"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,17 +32,20 @@ def get_remote_version_date():
     return datetime.datetime.strptime(commits[0]['commit']['committer']['date'], '%Y-%m-%dT%H:%M:%SZ')
 
 
-def check_for_updates():
+def is_update_available():
     """Check if an update is available based on the latest commit date."""
-    print("Checking for updates...")
     local_version_date = get_local_version_date()
     remote_version_date = get_remote_version_date()
 
     if remote_version_date is None:
-        return
+        return False
     # Calculate the difference in time
     time_difference = remote_version_date - local_version_date
     # Check if the difference is greater than 2 minutes
-    if time_difference > datetime.timedelta(minutes=2):
-        subprocess.Popen([UPDATER_EXE_PATH, EXE_PATH, GITHUB_EXE_URL])
-        sys.exit()
+    return time_difference > datetime.timedelta(minutes=2)
+
+
+def start_update():
+    """Hand over to the updater, which replaces the executable and restarts it."""
+    subprocess.Popen([UPDATER_EXE_PATH, EXE_PATH, GITHUB_EXE_URL])
+    sys.exit()